@@ -0,0 +1,144 @@
+'''
+Benchmark for the hiring columns of the labor_market export.
+
+To run this script (from the project root):
+
+python benchmarks/bench_export_hiring.py [offers_per_step]
+
+Builds a synthetic session (12 players, 10 periods, offers_per_step offers per player in each hiring step,
+20 by default = 1200 offers per player) in memory, and times building all hiring and work columns with:
+* the previous approach, which scanned the whole list of a player's offers for every period and step,
+* the current approach, which groups offers per player, period and step once (see build_offer_index()).
+
+No database is needed: offers and players are plain objects with the attributes the export reads.
+
+'''
+
+import random
+import sys
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from labor_market import (C, build_offer_index, get_period_offers, get_hiring_data, get_work_data,  # noqa: E402
+                          bool_to_int)
+
+NUM_PLAYERS = 12
+# A hiring step per Employee
+HIRING_STEPS = NUM_PLAYERS // 2
+CONFIG = dict(effort_costs=[0, 20, 40, 60, 100, 140, 180, 240, 300, 360],
+              skill_multipliers=[100, 140, 177, 211, 242, 270, 295, 317, 336, 352, 365, 375, 382, 386, 387],
+              employee_endowment=400, manager_endowment=800, base_revenue=1, training_productivity_multiplier=0.5,
+              training_cost=50)
+
+
+def synthetic_session(offers_per_step: int, rng: random.Random):
+    """Return (players, offers) for a synthetic session, players being a list of all rounds"""
+    session = SimpleNamespace(code="benchmark", config=CONFIG)
+    players = []
+    offers = []
+    player_id = 0
+
+    for period in range(1, C.NUM_ROUNDS + 1):
+        period_players = []
+        for id_in_group in range(1, NUM_PLAYERS + 1):
+            player_id += 1
+            period_players.append(SimpleNamespace(
+                id=player_id, id_in_group=id_in_group, round_number=period, session=session, skill=1,
+                role="Manager" if id_in_group <= NUM_PLAYERS // 2 else "Employee"))
+        players += period_players
+
+        managers = [player for player in period_players if player.role == "Manager"]
+        employees = [player for player in period_players if player.role == "Employee"]
+        for employee in employees:
+            accepted_step = rng.randint(1, HIRING_STEPS)
+            for step in range(1, HIRING_STEPS + 1):
+                for index in range(offers_per_step):
+                    accepted = step == accepted_step and index == 0
+                    offers.append(SimpleNamespace(
+                        manager=managers[index % len(managers)], employee=employee,
+                        manager_id=managers[index % len(managers)].id, employee_id=employee.id,
+                        period=period, step=step, wage=rng.randint(1, 1500), training=rng.random() < 0.5,
+                        accepted=accepted, rejected=not accepted, effort=rng.randint(1, 10),
+                        employee_earnings=0, manager_earnings=0))
+
+    return players, offers
+
+
+# Previous implementation: every (period, step) cell scans the full list of the player's offers
+
+def scanning_hiring_data_for_step(player, player_offers, step):
+    offers = [offer for offer in player_offers if offer.period == player.round_number and offer.step == step]
+
+    if len(offers) > 0:
+        if player.role == "Manager":
+            offer = offers[0]
+            manager_result = ["1", str(offer.employee.id_in_group), str(int(offer.wage)),
+                              str(bool_to_int(offer.training))]
+            employee_result = [""]
+        else:
+            manager_result = [""] * 4
+            employee_result = [str(len(offers))]
+        return manager_result + employee_result + [str(bool_to_int(any(offer.accepted for offer in offers)))]
+    elif player.role == "Manager":
+        offered_none = not any(offer.accepted for offer in player_offers
+                               if offer.manager == player and offer.period == player.round_number) and \
+                       len([offer for offer in player_offers if offer.manager == player and
+                            offer.period == player.round_number and offer.step == step]) == 0
+        return ["0" if offered_none else ""] + ["0"] * 3 + ["", "0"]
+    else:
+        return [""] * 4 + ["0", "0"]
+
+
+def scanning_export(players, offers):
+    offers_by_participant = {}
+    for offer in offers:
+        offers_by_participant.setdefault(offer.manager.id_in_group, []).append(offer)
+        offers_by_participant.setdefault(offer.employee.id_in_group, []).append(offer)
+
+    rows = []
+    for player in players:
+        player_offers = offers_by_participant.get(player.id_in_group, [])
+        row = []
+        for step in range(1, HIRING_STEPS + 1):
+            row += scanning_hiring_data_for_step(player, player_offers, step)
+        contracts = [offer for offer in player_offers if offer.accepted and offer.period == player.round_number]
+        row.append(contracts[0].wage if contracts else "")
+        rows.append(row)
+    return rows
+
+
+def indexed_export(players, offers):
+    offer_index = build_offer_index(offers)
+
+    rows = []
+    for player in players:
+        period_offers = get_period_offers(player, offer_index)
+        row = get_hiring_data(player, period_offers, HIRING_STEPS)
+        row.append(period_offers.contract.wage if period_offers.has_contract else "")
+        rows.append(row)
+    return rows
+
+
+def timed(function, *args) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    offers_per_step = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    players, offers = synthetic_session(offers_per_step, random.Random(0))
+    print(f"{len(players)} player-periods, {len(offers)} offers, "
+          f"{offers_per_step * HIRING_STEPS * C.NUM_ROUNDS} offers per employee")
+
+    scanning_time, scanning_rows = timed(scanning_export, players, offers)
+    indexed_time, indexed_rows = timed(indexed_export, players, offers)
+    # Work columns are not part of the comparison above, but make sure they can be built from the index
+    get_work_data(players[-1], get_period_offers(players[-1], build_offer_index(offers)))
+
+    assert scanning_rows == indexed_rows, "Both approaches must produce the same columns"
+    print(f"scan per (period, step): {scanning_time * 1000:9.1f} ms")
+    print(f"grouped once:            {indexed_time * 1000:9.1f} ms  ({scanning_time / indexed_time:.0f}x faster)")
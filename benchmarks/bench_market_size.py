@@ -0,0 +1,172 @@
+'''
+Benchmark for the server time of the labor_market hiring phase as the market grows.
+
+To run this script (from the project root):
+
+python benchmarks/bench_market_size.py [size ...]
+
+For every size (6, 20 and 50 by default), creates a session of one market of size Managers and size Employees in an
+in-memory database, and plays the hiring phase of the first period with random decisions:
+* in hiring steps: MakeOffer for every Manager, GetOffers for every Employee (each shown if they can act), then
+  WaitForAcceptance.after_all_players_arrive, until the market is cleared (only for markets of up to
+  market.MAX_STEPS_EMPLOYEES Employees, the most that can hire in steps),
+* on the live market (hiring_mode="live"): one offer at a time from the Managers who can hire, each answered by its
+  Employee (live_market()).
+Every page visit or live action runs like a request of its own: on a fresh player object, with the ORM objects of
+the previous request dropped, calling is_displayed, vars_for_template and before_next_page (templates are not
+rendered). Pages that are skipped (is_displayed is False) count as visits too, since the server still checks them.
+Reports server time and SQL queries per hiring step and per page visit (steps), and per action (live).
+
+'''
+
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.chdir(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, os.getcwd())
+os.environ["OTREE_IN_MEMORY"] = "1"
+
+import market  # noqa: E402
+import settings  # noqa: E402
+
+SIZES = [int(size) for size in sys.argv[1:]] or [6, 20, 50]
+
+# Session configs of the benchmarked markets, added before oTree reads the settings. Larger markets than the page
+# sequence has hiring steps for only hire on the live market
+settings.SESSION_CONFIGS += [
+    dict(name=f"bench_market_{size}_{hiring_mode}", app_sequence=["labor_market"], num_demo_participants=2 * size,
+         market="heterogeneous", starting_skills=settings.STARTING_SKILLS_BY_MARKET["heterogeneous"],
+         num_managers=size, num_employees=size, hiring_mode=hiring_mode)
+    for size in SIZES for hiring_mode in ("steps", "live")
+    if hiring_mode == "live" or size <= market.MAX_STEPS_EMPLOYEES
+]
+
+from otree.main import setup  # noqa: E402
+
+setup()
+
+import otree.session  # noqa: E402
+from otree.database import db, engine  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from labor_market import (GetOffers, Group, MakeOffer, Player, WaitForAcceptance, live_market,  # noqa: E402
+                          offer_employee_choices, player_matched_choices)
+
+query_count = 0
+
+
+def count_query(*args):
+    global query_count
+    query_count += 1
+
+
+event.listen(engine, "before_cursor_execute", count_query)
+
+
+class Requests:
+    """Time and queries of the requests of a hiring step (or of all live actions)"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+
+    def run(self, function, model, object_id: int):
+        """Run function on a freshly loaded object, as in a request of its own. Not counted if function returns
+        False (nothing to do for that player)"""
+        global query_count
+        db._db.flush()
+        db._db.expunge_all()
+        query_count = 0
+        start = time.perf_counter()
+        done = function(model.objects_get(id=object_id))
+        db._db.flush()
+        if done is not False:
+            self.seconds += time.perf_counter() - start
+            self.queries += query_count
+            self.count += 1
+
+
+def create_market(size: int, hiring_mode: str) -> tuple[int, list[int], list[int]]:
+    """Create a session of one market; return the ids of its group, Managers and Employees"""
+    session = otree.session.create_session(session_config_name=f"bench_market_{size}_{hiring_mode}",
+                                           num_participants=2 * size)
+    group = session.get_subsessions()[0].get_groups()[0]
+    return group.id, [player.id for player in group.managers], [player.id for player in group.employees]
+
+
+def hiring_steps(size: int, rng: random.Random) -> list[Requests]:
+    """Play the hiring steps of the first period; return the requests of every step"""
+    group_id, manager_ids, employee_ids = create_market(size, "steps")
+
+    def make_offer(manager: Player):
+        if MakeOffer.is_displayed(manager):
+            MakeOffer.vars_for_template(manager)
+            manager.offer_employee = rng.choice(offer_employee_choices(manager)[:-1])
+            manager.offer_wage = rng.randint(1, manager.session.config["max_wage"])
+            manager.offer_training = rng.random() < 0.5
+            MakeOffer.before_next_page(manager, timeout_happened=False)
+
+    def get_offers(employee: Player):
+        if GetOffers.is_displayed(employee):
+            GetOffers.vars_for_template(employee)
+            employee.player_matched = rng.choice(player_matched_choices(employee))
+            GetOffers.before_next_page(employee, timeout_happened=False)
+
+    steps = []
+    while not Group.objects_get(id=group_id).market_cleared:
+        step = Requests()
+        for manager_id in manager_ids:
+            step.run(make_offer, Player, manager_id)
+        for employee_id in employee_ids:
+            step.run(get_offers, Player, employee_id)
+        step.run(WaitForAcceptance.after_all_players_arrive, Group, group_id)
+        steps.append(step)
+    return steps
+
+
+def live_hiring(size: int, rng: random.Random) -> Requests:
+    """Play the live market of the first period; return its requests"""
+    group_id, manager_ids, employee_ids = create_market(size, "live")
+    actions = Requests()
+    offers = []
+
+    def offer(manager: Player):
+        choices = offer_employee_choices(manager)[:-1]
+        if manager.player_matched > 0 or not choices:
+            return False
+        employee_id = rng.choice(choices)
+        live_market(manager, dict(type="offer", employee=employee_id, wage=rng.randint(1, 1500),
+                                  training=rng.random() < 0.5))
+        offers.append((employee_id, manager.id_in_group))
+
+    def answer(employee: Player):
+        _, manager_id = offers.pop()
+        live_market(employee, dict(type=rng.choice(["accept", "reject"]), manager=manager_id))
+
+    while not Group.objects_get(id=group_id).market_cleared:
+        for manager_id in manager_ids:
+            actions.run(offer, Player, manager_id)
+            while offers:
+                actions.run(answer, Player, employee_ids[offers[-1][0] - size - 1])
+    return actions
+
+
+if __name__ == "__main__":
+    print(f"{'market':>8} | {'steps':>5} {'ms/step':>9} {'queries/step':>12} {'ms/page':>8} | "
+          f"{'actions':>7} {'ms/action':>9} {'queries/action':>14}")
+    for size in SIZES:
+        if size <= market.MAX_STEPS_EMPLOYEES:
+            steps = hiring_steps(size, random.Random(0))
+            pages = sum(step.count for step in steps)
+            steps_columns = (f"{len(steps):5d} {sum(step.seconds for step in steps) / len(steps) * 1000:9.1f} "
+                             f"{sum(step.queries for step in steps) / len(steps):12.0f} "
+                             f"{sum(step.seconds for step in steps) / pages * 1000:8.2f}")
+        else:
+            steps_columns = f"{'-':>5} {'-':>9} {'-':>12} {'-':>8}"
+        live = live_hiring(size, random.Random(0))
+        print(f"{size:>3} x {size:<3} | {steps_columns} | "
+              f"{live.count:7d} {live.seconds / live.count * 1000:9.2f} {live.queries / live.count:14.1f}")
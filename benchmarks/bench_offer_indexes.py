@@ -0,0 +1,133 @@
+'''
+Benchmark for the database indexes of the labor_market Offer table.
+
+To run this script (from the project root):
+
+python benchmarks/bench_offer_indexes.py [max_rows]
+
+Grows an Offer table in a temporary SQLite database file to 20 000, 200 000 and 2 000 000 rows (or up to max_rows,
+in steps of 10x), filled like past sessions: groups of 6 managers and 6 employees, 30 offers per group and period.
+At every size, times the Offer lookups of the app without and with the composite indexes declared in
+labor_market.INDEXES:
+* open offers of an employee (GetOffers),
+* contract of a manager (Player.contract),
+* offers of a participant in all periods (Player.offer_history),
+* contracts of a group in a period (settle_payoffs).
+
+'''
+
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from itertools import islice
+from pathlib import Path
+
+os.chdir(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, os.getcwd())
+os.environ["OTREE_IN_MEMORY"] = "1"
+
+from otree.main import setup  # noqa: E402
+
+setup()
+
+import sqlalchemy  # noqa: E402
+from sqlalchemy.schema import CreateTable  # noqa: E402
+
+import market  # noqa: E402
+from labor_market import C, INDEXES, Offer  # noqa: E402
+
+OFFERS_PER_GROUP_PERIOD = 30
+PLAYERS_PER_GROUP = market.NUM_MANAGERS + market.NUM_EMPLOYEES
+REPETITIONS = 30
+
+table = Offer.__table__
+indexes = [index for index in table.indexes if index.name in {name for model, name, _ in INDEXES if model is Offer}]
+
+
+def offer_rows(first_block: int, num_blocks: int, rng: random.Random):
+    """Offers of num_blocks group-periods. Players of a group-period have ids block * 12 + 1 to block * 12 + 12,
+    their participants the same ids in the first period of the group"""
+    for block in range(first_block, first_block + num_blocks):
+        base = block * PLAYERS_PER_GROUP
+        participant_base = (block - block % C.NUM_ROUNDS) * PLAYERS_PER_GROUP
+        for index in range(OFFERS_PER_GROUP_PERIOD):
+            status = rng.random()
+            manager, employee = rng.randint(1, 6), rng.randint(7, 12)
+            yield dict(period=block % C.NUM_ROUNDS + 1, step=index // 6 + 1, group_id=block, session_id=1,
+                       manager_id=base + manager, employee_id=base + employee,
+                       manager_participant_id=participant_base + manager,
+                       employee_participant_id=participant_base + employee,
+                       wage=rng.randint(1, 1500), training=rng.random() < 0.5,
+                       accepted=status < 0.2, rejected=0.2 <= status < 0.9, effort=0, revenue=0)
+
+
+def lookups(num_blocks: int, rng: random.Random) -> dict[str, sqlalchemy.sql.Select]:
+    """One of each lookup, for random players and groups"""
+    block = rng.randrange(num_blocks)
+    player_id = block * PLAYERS_PER_GROUP + rng.randint(1, 6)
+    employee_id = player_id + 6
+    period = block % C.NUM_ROUNDS + 1
+    # The participant of the manager is the player of the first period of their group (see offer_rows())
+    participant_id = player_id - (period - 1) * PLAYERS_PER_GROUP
+    c = table.c
+
+    return {
+        "open offers of an employee": table.select().where(
+            (c.employee_id == employee_id) & (c.accepted == False) & (c.rejected == False)),  # noqa: E712
+        "contract of a manager": table.select().where((c.manager_id == player_id) & (c.accepted == True)),  # noqa: E712
+        "offer history of a participant": table.select().where(
+            (c.manager_participant_id == participant_id) & (c.period <= period)).order_by(c.period, c.step, c.id),
+        "contracts of a group in a period": table.select().where(
+            (c.group_id == block) & (c.period == period) & (c.accepted == True)),  # noqa: E712
+    }
+
+
+def time_lookups(connection, num_blocks: int) -> dict[str, float]:
+    """Median time of each lookup in ms"""
+    rng = random.Random(1)
+    times = {}
+    for _ in range(REPETITIONS):
+        for name, query in lookups(num_blocks, rng).items():
+            start = time.perf_counter()
+            connection.execute(query).fetchall()
+            times.setdefault(name, []).append((time.perf_counter() - start) * 1000)
+    return {name: statistics.median(values) for name, values in times.items()}
+
+
+if __name__ == "__main__":
+    max_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    sizes = [max_rows // 100, max_rows // 10, max_rows]
+
+    with tempfile.TemporaryDirectory() as directory:
+        engine = sqlalchemy.create_engine(f"sqlite:///{directory}/offers.sqlite3")
+        rng = random.Random(0)
+
+        with engine.connect() as connection:
+            # The table alone; its indexes are created and dropped below
+            connection.execute(CreateTable(table))
+            num_blocks = 0
+
+            for size in sizes:
+                new_blocks = size // OFFERS_PER_GROUP_PERIOD - num_blocks
+                rows = offer_rows(num_blocks, new_blocks, rng)
+                with connection.begin():
+                    while batch := list(islice(rows, 100_000)):
+                        connection.execute(table.insert(), batch)
+                num_blocks += new_blocks
+
+                without_indexes = time_lookups(connection, num_blocks)
+                start = time.perf_counter()
+                for index in indexes:
+                    index.create(connection)
+                index_time = time.perf_counter() - start
+                with_indexes = time_lookups(connection, num_blocks)
+                for index in indexes:
+                    index.drop(connection)
+
+                print(f"{num_blocks * OFFERS_PER_GROUP_PERIOD:,} offers (indexes created in {index_time:.1f} s), "
+                      f"median of {REPETITIONS} lookups:")
+                for name in without_indexes:
+                    print(f"  {name:34s} {without_indexes[name]:9.3f} ms -> {with_indexes[name]:7.3f} ms")
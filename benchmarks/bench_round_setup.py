@@ -0,0 +1,120 @@
+'''
+Benchmark for setting up labor_market periods in large sessions.
+
+To run this script (from the project root):
+
+python benchmarks/bench_round_setup.py [num_groups]
+
+Creates a test_simulation session with num_groups groups (100 by default = 1200 participants, 10 periods) in an
+in-memory database and times it. Then times the two per-period copy steps, once for the whole session:
+* copying round-1 labels to periods 2-10 (creating_session),
+* carrying skills over from the previous period (WaitForAllPlayers.after_all_players_arrive, for every group),
+with the previous approach, which looked up each player's other round with player.in_round(), and the current one,
+which loads the values of all players in one query. SQL queries are counted for both.
+
+'''
+
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+os.chdir(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, os.getcwd())
+os.environ["OTREE_IN_MEMORY"] = "1"
+
+from otree.main import setup  # noqa: E402
+
+setup()
+
+import otree.session  # noqa: E402
+from otree.database import db, engine  # noqa: E402
+from otree.models import Participant  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import market  # noqa: E402
+from labor_market import C, Player, Subsession, WaitForAllPlayers, creating_session  # noqa: E402
+
+query_count = 0
+
+
+def count_query(*args):
+    global query_count
+    query_count += 1
+
+
+event.listen(engine, "before_cursor_execute", count_query)
+
+
+# Previous implementation: one in_round() lookup per player
+
+def in_round_labels(subsession):
+    subsession.group_like_round(1)
+    for player in subsession.get_players():
+        player.label = player.in_round(1).label
+
+
+def in_round_skills(group):
+    for player in group.get_players():
+        prev_player = player.in_round(group.round_number - 1)
+        player.skill = prev_player.skill
+        if prev_player.skill_increase:
+            player.skill = min(player.skill + 1, len(group.session.config["skill_multipliers"]))
+
+
+def timed(function, items) -> tuple[float, int]:
+    """Time function applied to every item, and count the queries it made"""
+    global query_count
+    db._db.flush()
+    query_count = 0
+    start = time.perf_counter()
+    for item in items:
+        function(item)
+    db._db.flush()
+    return time.perf_counter() - start, query_count
+
+
+def report(name: str, previous: tuple[float, int], current: tuple[float, int]):
+    print(f"{name}:")
+    print(f"  per player (in_round): {previous[0] * 1000:9.1f} ms  {previous[1]:6d} queries")
+    print(f"  one query:             {current[0] * 1000:9.1f} ms  {current[1]:6d} queries  "
+          f"({previous[0] / current[0]:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    num_groups = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+
+    start = time.perf_counter()
+    session = otree.session.create_session(session_config_name="test_simulation",
+                                           num_participants=num_groups * (market.NUM_MANAGERS + market.NUM_EMPLOYEES))
+    print(f"created a session of {num_groups} groups and {C.NUM_ROUNDS} periods in "
+          f"{time.perf_counter() - start:.1f} s")
+
+    later_subsessions = [subsession for subsession in session.get_subsessions()
+                         if isinstance(subsession, Subsession) and subsession.round_number > 1]
+
+    # Some employees got training in each period, so that skills actually change
+    rng = random.Random(0)
+    for player in Player.objects_filter(session_id=session.id):
+        player.skill_increase = player.role == "Employee" and rng.random() < 0.5
+
+    # Participants are in memory while a session is created; keep them loaded, as the identity map only holds
+    # objects that are referenced somewhere
+    participants = Participant.objects_filter(session_id=session.id).all()
+
+    expected_labels = {player.id: player.label for player in Player.objects_filter(session_id=session.id)}
+    previous = timed(in_round_labels, later_subsessions)
+    current = timed(creating_session, later_subsessions)
+    assert {player.id: player.label for player in Player.objects_filter(session_id=session.id)} == expected_labels
+    report(f"labels of periods 2-{C.NUM_ROUNDS}", previous, current)
+
+    # group_like_round() recreates the groups, so they are only listed now. Periods are processed in order, as in
+    # a session, so that skills build on the previous period
+    later_groups = [group for subsession in later_subsessions for group in subsession.get_groups()]
+    previous = timed(in_round_skills, later_groups)
+    expected_skills = {player.id: player.skill for player in Player.objects_filter(session_id=session.id)}
+    current = timed(WaitForAllPlayers.after_all_players_arrive, later_groups)
+    assert {player.id: player.skill for player in Player.objects_filter(session_id=session.id)} == expected_skills, \
+        "Both approaches must carry over the same skills"
+    report(f"skills of periods 2-{C.NUM_ROUNDS}", previous, current)
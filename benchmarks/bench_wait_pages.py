@@ -0,0 +1,150 @@
+'''
+Benchmark for the wait page barriers of labor_market in sessions with many groups.
+
+To run this script (from the project root):
+
+python benchmarks/bench_wait_pages.py [num_groups ...]
+
+For every number of groups (1, 10, 50 and 100 by default), creates a test_simulation session of that many groups of 12
+players (10 periods) in an in-memory database, with offers and contracts in every group and period, and the wait pages
+of every group recorded as completed. Then times the barrier of single groups at each wait page of period 2, as the
+server runs it when the last player of a group arrives: oTree's lookups (whether the group already completed the page,
+and the participants of the group with their page index), after_all_players_arrive, and recording the completion.
+Every barrier runs like a request of its own, with the ORM objects of the previous one dropped.
+
+Times are given without and with the indexes for group lookups declared in labor_market.INDEXES. With them, the
+barrier of a group should take the same time whatever the number of groups in the session.
+
+'''
+
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+os.chdir(Path(__file__).resolve().parent.parent)
+sys.path.insert(0, os.getcwd())
+os.environ["OTREE_IN_MEMORY"] = "1"
+
+from otree.main import setup  # noqa: E402
+
+setup()
+
+import otree.session  # noqa: E402
+from otree.database import db, dbq, engine  # noqa: E402
+from otree.lookup import get_min_idx_for_app  # noqa: E402
+from otree.models import Participant  # noqa: E402
+from otree.models_concrete import CompletedGroupWaitPage  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import labor_market  # noqa: E402
+from labor_market import (INDEXES, C, Group, Offer, Player, WaitForAcceptance, WaitForAllPlayers,  # noqa: E402
+                          WaitForEffort, page_sequence)
+
+WAIT_PAGES = [WaitForAllPlayers, WaitForAcceptance, WaitForEffort]
+SAMPLE_GROUPS = 10
+PERIOD = 2
+
+indexes = [index for model, name, _ in INDEXES if model in (Player, CompletedGroupWaitPage)
+           for index in model.__table__.indexes if index.name == name]
+
+query_count = 0
+
+
+def count_query(*args):
+    global query_count
+    query_count += 1
+
+
+event.listen(engine, "before_cursor_execute", count_query)
+
+
+def page_index(session_code: str, page_class, period: int) -> int:
+    """Index in the session's page sequence of the (first) page_class of a period"""
+    return (get_min_idx_for_app(session_code, labor_market.__name__) + (period - 1) * len(page_sequence) +
+            page_sequence.index(page_class))
+
+
+def filled_session(num_groups: int, rng: random.Random):
+    """Create a session with offers, contracts and completed wait pages in every group and period"""
+    session = otree.session.create_session(session_config_name="test_simulation", num_participants=num_groups * 12)
+    groups = Group.objects_filter(session_id=session.id).all()
+    players = Player.objects_filter(session_id=session.id).all()
+    players_by_group = {}
+    for player in players:
+        players_by_group.setdefault(player.group_id, []).append(player)
+        player.skill_increase = rng.random() < 0.5
+
+    offers = []
+    completions = []
+    for group in groups:
+        group_players = sorted(players_by_group[group.id], key=lambda p: p.id_in_group)
+        managers, employees = group_players[:6], group_players[6:]
+        for index, (manager, employee) in enumerate(zip(managers, employees)):
+            accepted = index % 2 == 0
+            offers.append(dict(period=group.round_number, step=1, manager_id=manager.id, employee_id=employee.id,
+                               group_id=group.id, session_id=session.id,
+                               manager_participant_id=manager.participant_id,
+                               employee_participant_id=employee.participant_id, wage=rng.randint(1, 1500),
+                               training=rng.random() < 0.5, accepted=accepted, rejected=not accepted,
+                               effort=rng.randint(1, 10) if accepted else 0, revenue=0))
+        for page_class in WAIT_PAGES:
+            completions.append(dict(page_index=page_index(session.code, page_class, group.round_number),
+                                    group_id=group.id, session_id=session.id))
+    db._db.bulk_insert_mappings(Offer, offers)
+    db._db.bulk_insert_mappings(CompletedGroupWaitPage, completions)
+    db._db.flush()
+    return session, [group.id for group in groups if group.round_number == PERIOD]
+
+
+def barrier(session_id: int, group_id: int, page_class, index: int) -> tuple[float, int]:
+    """Time and queries of the barrier of a group at a wait page, as run by oTree for the last player to arrive"""
+    global query_count
+    db._db.flush()
+    db._db.expunge_all()
+    query_count = 0
+    start = time.perf_counter()
+
+    CompletedGroupWaitPage.objects_exists(page_index=index, group_id=group_id, session_id=session_id)
+    participants = dbq(Player).join(Participant).filter(Player.group_id == group_id).with_entities(Participant).all()
+    assert all(participant._index_in_pages is not None for participant in participants)
+    page_class.after_all_players_arrive(Group.objects_get(id=group_id))
+    db.add(CompletedGroupWaitPage(page_index=index, group_id=group_id, session_id=session_id))
+    db._db.flush()
+
+    return time.perf_counter() - start, query_count
+
+
+def time_barriers(session_id: int, session_code: str, group_ids: list[int]) -> dict[str, tuple[float, float]]:
+    """Median time (ms) and queries of the barrier of sampled groups, per wait page"""
+    results = {}
+    for page_class in WAIT_PAGES:
+        index = page_index(session_code, page_class, PERIOD)
+        samples = [barrier(session_id, group_id, page_class, index) for group_id in group_ids]
+        results[page_class.__name__] = (statistics.median(seconds for seconds, _ in samples) * 1000,
+                                        statistics.median(queries for _, queries in samples))
+    return results
+
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in sys.argv[1:]] or [1, 10, 50, 100]
+
+    for num_groups in sizes:
+        session, group_ids = filled_session(num_groups, random.Random(0))
+        session_id, session_code = session.id, session.code
+        sampled = group_ids[::max(1, len(group_ids) // SAMPLE_GROUPS)][:SAMPLE_GROUPS]
+
+        # On the connection of the ORM session, which holds the in-memory database
+        for index in indexes:
+            index.drop(db._db.connection())
+        without_indexes = time_barriers(session_id, session_code, sampled)
+        for index in indexes:
+            index.create(db._db.connection())
+        with_indexes = time_barriers(session_id, session_code, sampled)
+
+        print(f"{num_groups} groups ({num_groups * 12} participants, {C.NUM_ROUNDS} periods), "
+              f"median barrier of {len(sampled)} groups in period {PERIOD}:")
+        for name, (seconds, queries) in with_indexes.items():
+            print(f"  {name:18s} {without_indexes[name][0]:8.2f} ms -> {seconds:6.2f} ms  {queries:3.0f} queries")
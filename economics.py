@@ -0,0 +1,101 @@
+"""Economics of the labor market (revenue, payoff and skill tables), compiled once per session config"""
+import numpy as np
+from otree.api import cu
+
+# Session config fields the economics are computed from
+CONFIG_FIELDS = ("skill_multipliers", "effort_costs", "employee_endowment", "manager_endowment", "base_revenue",
+                 "training_productivity_multiplier", "training_cost")
+
+# Keyed by the values of CONFIG_FIELDS, so all sessions of a config share one entry, however many run at once. There
+# are as many entries as distinct configs were played, which is a handful
+_economics_by_config: dict[tuple, "Economics"] = {}
+
+
+class Economics:
+    """Revenue and payoff tables of a session config.
+
+    Tables are indexed [skill - 1][effort - 1] and must not be modified, since the same object is shared by all
+    pages of all sessions with the same config (see economics_for())."""
+
+    def __init__(self, config: dict):
+        self.skill_multipliers: tuple[int, ...] = tuple(config["skill_multipliers"])
+        self.effort_costs: tuple[int, ...] = tuple(config["effort_costs"])
+        self.employee_endowment: int = config["employee_endowment"]
+        self.manager_endowment: int = config["manager_endowment"]
+        self.training_cost: int = config["training_cost"]
+        self.training_productivity_multiplier: float = config["training_productivity_multiplier"]
+        efforts = range(1, len(self.effort_costs) + 1)
+
+        # Revenue generated by an employee
+        self.revenue = tuple(tuple(config["base_revenue"] * multiplier * effort for effort in efforts)
+                             for multiplier in self.skill_multipliers)
+        # With training: the productivity reduction is rounded like currency (the payoffs), and is
+        # subtracted from the revenue together with the training cost
+        self.productivity_reduction = tuple(tuple(round(cu(revenue) * self.training_productivity_multiplier)
+                                                  for revenue in row) for row in self.revenue)
+        self.trained_revenue = tuple(tuple(cu(revenue) * self.training_productivity_multiplier - self.training_cost
+                                           for revenue in row) for row in self.revenue)
+
+        self.revenue_array = read_only(np.array(self.revenue, dtype=np.float64))
+        self.trained_revenue_array = read_only(np.array(self.trained_revenue, dtype=np.float64))
+        # The export records revenue with training without rounding
+        self.unrounded_trained_revenue_array = read_only(
+            self.revenue_array * self.training_productivity_multiplier - self.training_cost)
+        self.effort_costs_array = read_only(np.array(self.effort_costs))
+
+        # Revenue table shown in the instructions, one item per skill level (revenue with base revenue 1)
+        self.skill_table = tuple({
+            "level": index + 1,
+            "multiplier": multiplier,
+            "revenue": [effort * multiplier for effort in range(1, 11)]
+        } for index, multiplier in enumerate(self.skill_multipliers))
+
+    def manager_revenue(self, skill: int, effort: int, training: bool) -> cu:
+        """Revenue of a manager from an employee, after training costs"""
+        if training:
+            return self.trained_revenue[skill - 1][effort - 1]
+        return cu(self.revenue[skill - 1][effort - 1])
+
+    def manager_payoff(self, skill: int, effort: int, wage: cu | int, training: bool) -> cu:
+        return self.manager_endowment + self.manager_revenue(skill, effort, training) - wage
+
+    def employee_payoff(self, wage: cu | int, effort: int) -> cu | int:
+        return self.employee_endowment + wage - self.effort_costs[effort - 1]
+
+    def manager_earnings(self, skill: int, effort: int, wage: int, training: bool) -> float | int:
+        """Manager payoff as recorded in the export, where revenue with training is not rounded"""
+        revenue = self.revenue[skill - 1][effort - 1]
+        if training:
+            return (self.manager_endowment + revenue * self.training_productivity_multiplier - self.training_cost
+                    - wage)
+        return self.manager_endowment + revenue - wage
+
+    def contract_earnings(self, skill: np.ndarray, effort: np.ndarray, wage: np.ndarray, training: np.ndarray,
+                          round_revenue: bool = False) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized period outcome of contracts, given as arrays of equal length.
+
+        Returns employee earnings, manager earnings and manager revenue (after training costs). Values are only
+        meaningful where effort > 0. With round_revenue, revenue with training is rounded the way currency
+        arithmetic rounds it (as in payoffs); otherwise it is left unrounded (as in the export)."""
+        trained_revenue = self.trained_revenue_array if round_revenue else self.unrounded_trained_revenue_array
+        revenue = np.where(training, trained_revenue[skill - 1, effort - 1], self.revenue_array[skill - 1, effort - 1])
+        employee_earnings = self.employee_endowment + wage - self.effort_costs_array[effort - 1]
+        manager_earnings = self.manager_endowment + revenue - wage
+
+        return employee_earnings, manager_earnings, revenue
+
+
+def read_only(array: np.ndarray) -> np.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def economics_for(session) -> Economics:
+    """Return the economics of a session, compiling them on first use of its config"""
+    config = session.config
+    key = tuple(tuple(value) if isinstance(value, list) else value
+                for value in (config[field] for field in CONFIG_FIELDS))
+    economics = _economics_by_config.get(key)
+    if economics is None:
+        economics = _economics_by_config[key] = Economics(config)
+    return economics
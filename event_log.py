@@ -0,0 +1,135 @@
+"""Structured event log of the labor market (groups, offers, timeouts, payoffs and pages over their query budget),
+written as JSON lines.
+
+Logging an event only puts a record on a queue; a background thread writes the queued records to the log file in
+batches, so pages never wait for disk I/O. Each line is one JSON object with the time, level, event name, session
+code and period, plus the fields of the event. Set EVENT_LOG_FILE and EVENT_LOG_LEVEL in settings.py to choose
+where events go and which are kept (e.g. WARNING keeps only timeouts and queries over budget); without
+EVENT_LOG_FILE, no events are written. The writer thread is started with the first event."""
+import atexit
+import json
+import logging
+import queue
+import threading
+from datetime import datetime, timezone
+from logging.handlers import BufferingHandler, QueueHandler, QueueListener
+
+from otree import settings
+
+# Records written at once when events come in faster than they can be written
+BATCH_SIZE = 200
+
+logger = logging.getLogger("labor_market.events")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "event": record.getMessage(),
+            **record.fields
+        })
+
+
+class JsonLinesHandler(BufferingHandler):
+    """Appends buffered records to a JSON lines file, one write per batch"""
+
+    def __init__(self, path: str, capacity: int):
+        super().__init__(capacity)
+        self.path = path
+        self.setFormatter(JsonLinesFormatter())
+
+    def flush(self):
+        with self.lock:
+            if self.buffer:
+                with open(self.path, "a", encoding="utf-8") as outf:
+                    outf.write("".join(f"{self.format(record)}\n" for record in self.buffer))
+                self.buffer.clear()
+
+
+class BatchingQueueListener(QueueListener):
+    """Queue listener that writes out buffered records whenever the queue runs empty.
+
+    Under load, records pile up in the queue and are written in batches of up to BATCH_SIZE; when events are
+    sparse, each one is written as soon as the queue is drained."""
+
+    def dequeue(self, block: bool):
+        if block and self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+        return super().dequeue(block)
+
+
+# Listener writing the queued events, once started
+_listener = None
+_start_lock = threading.Lock()
+
+
+def start():
+    """Send the events through a queue to the JSON lines file of EVENT_LOG_FILE, until the process exits.
+
+    Called on the first event, so processes that log nothing start no thread and open no file. Without
+    EVENT_LOG_FILE, events are dropped."""
+    global _listener
+    with _start_lock:
+        if _listener is not None or logger.disabled:
+            return
+        path = getattr(settings, "EVENT_LOG_FILE", None)
+        if not path:
+            logger.disabled = True
+            return
+
+        records = queue.SimpleQueue()
+        handler = JsonLinesHandler(path, BATCH_SIZE)
+        _listener = BatchingQueueListener(records, handler)
+
+        logger.setLevel(getattr(settings, "EVENT_LOG_LEVEL", "INFO"))
+        logger.addHandler(QueueHandler(records))
+        # Events are only written to the file, not to the server console
+        logger.propagate = False
+
+        _listener.start()
+        atexit.register(stop, _listener, handler)
+
+def stop(listener: QueueListener, handler: logging.Handler):
+    listener.stop()
+    handler.close()
+
+
+# Events
+
+def log_event(level: int, event: str, session_code: str, period: int | None, **fields):
+    if _listener is None and not logger.disabled:
+        start()
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": {"session": session_code, "period": period, **fields}})
+
+def groups_formed(session, app_name: str, group_matrix: list[list[int]]):
+    log_event(logging.INFO, "groups_formed", session.code, None, app=app_name, group_matrix=group_matrix)
+
+def offer_made(offer):
+    log_event(logging.INFO, "offer_made", offer.manager.session.code, offer.period, step=offer.step,
+              manager=offer.manager.id_in_group, employee=offer.employee.id_in_group, wage=float(offer.wage),
+              training=bool(offer.training))
+
+def offer_accepted(offer):
+    log_event(logging.INFO, "offer_accepted", offer.manager.session.code, offer.period, step=offer.step,
+              manager=offer.manager.id_in_group, employee=offer.employee.id_in_group, wage=float(offer.wage),
+              training=bool(offer.training))
+
+def offer_rejected(offer):
+    log_event(logging.INFO, "offer_rejected", offer.manager.session.code, offer.period, step=offer.step,
+              manager=offer.manager.id_in_group, employee=offer.employee.id_in_group)
+
+def timeout(player, page: str, outcome: str):
+    log_event(logging.WARNING, "timeout", player.session.code, player.round_number, page=page, role=player.role,
+              player=player.id_in_group, outcome=outcome)
+
+def payoff_computed(player, payoff):
+    log_event(logging.INFO, "payoff_computed", player.session.code, player.round_number, role=player.role,
+              player=player.id_in_group, payoff=float(payoff))
+
+def query_budget_exceeded(player_or_group, page: str, hook: str, queries: int, budget: int):
+    log_event(logging.WARNING, "query_budget_exceeded", player_or_group.session.code, player_or_group.round_number,
+              page=page, hook=hook, queries=queries, budget=budget)
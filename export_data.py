@@ -0,0 +1,166 @@
+'''
+Export labor_market data without going through the admin "Data" page.
+
+To run this script:
+
+python export_data.py outfile.csv [session_code ...]
+python export_data.py outfile.npz [session_code ...]
+python export_data.py --job outdir [--workers N] [session_code ...]
+
+It connects to the same database as the server (set DATABASE_URL the same way as for "otree prodserver").
+If no session codes are given, all sessions in the database are exported.
+
+* outfile.csv gets the same wide CSV as the admin custom export. Unlike the admin export, sessions are loaded
+  and written one at a time, so memory use stays flat even when the database holds hundreds of archived sessions.
+  Rows of finished sessions are cached in the database the first time they are exported (same as in the admin
+  export), so later exports only compute sessions that are new or still running.
+* outfile.npz gets the long, typed export (see labor_market.long_export): one row per offer in the "offers.*"
+  arrays and one row per player and period in the "periods.*" arrays. Load it with numpy.load(),
+  or e.g. pandas.DataFrame({name[7:]: data[name] for name in data.files if name.startswith('offers.')}).
+* --job writes the labor_market and outro_quiz custom exports to outdir/labor_market.csv and outdir/outro_quiz.csv,
+  computing sessions in a pool of N worker processes (2 by default) and printing progress as sessions complete.
+  The list of sessions is taken once when the job starts; sessions created later are left for the next job. Rows of
+  finished sessions are cached as with outfile.csv, written by the main process only (workers only read the
+  database, so that they do not lock each other out of SQLite).
+  Each file is written under a .part name and renamed when it is complete, so it can be picked up (or served for
+  download) as soon as it appears.
+
+Use --job for large exports while a session is running: the admin export runs inside the web process, and
+participants' page loads wait while it computes. On Heroku, run it in a one-off dyno so that neither the web nor
+the worker dyno of the Procfile is involved: heroku run python export_data.py --job exports
+
+'''
+
+import csv
+import os
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from multiprocessing import get_context
+
+import numpy as np
+from otree.main import setup
+
+JOB_APPS = ['labor_market', 'outro_quiz']
+
+
+# The oTree and app imports below are done inside the functions, since they need setup() to have run first
+
+def write_csv(outf, rows):
+    from otree.export import sanitize_for_csv
+
+    writer = csv.writer(outf)
+    for row in rows:
+        writer.writerow([sanitize_for_csv(value) for value in row])
+
+
+def export_file(outfile, session_codes):
+    from otree.database import session_scope
+    from labor_market import long_export, stream_export
+
+    # The session scope commits the export cache of newly finished sessions (see labor_market.session_export_rows)
+    with session_scope():
+        if outfile.endswith('.npz'):
+            np.savez_compressed(outfile, **long_export(session_codes))
+        else:
+            with open(outfile, 'w', newline='', encoding='utf-8') as outf:
+                write_csv(outf, stream_export(session_codes))
+
+
+# Export job
+
+def job_headers(hiring_steps):
+    import labor_market
+    import outro_quiz
+
+    return {
+        'labor_market': labor_market.export_header(hiring_steps),
+        'outro_quiz': next(outro_quiz.custom_export([])),
+    }
+
+
+def job_session_rows(hiring_steps, session_code):
+    """Rows of one session for each app of the job (runs in a worker process), with hiring_steps steps per period in
+    the labor_market columns, and whether the labor_market rows are to be cached (see run_job())"""
+    from otree.database import session_scope
+    from otree.export import sanitize_for_csv
+    from otree.models import Session
+    import labor_market
+    import outro_quiz
+
+    with session_scope():
+        session_id = Session.objects_filter(code=session_code).one().id
+        outro_players = outro_quiz.Player.objects_filter(session_id=session_id).order_by(outro_quiz.Player.id).all()
+        for player in outro_players:
+            player._is_frozen = False
+
+        labor_rows = labor_market.cached_export_rows(session_code, hiring_steps)
+        to_cache = False
+        if labor_rows is None:
+            session_players = labor_market.load_session_players(session_id)
+            labor_rows = labor_market.export_for_session_players(session_players, hiring_steps)
+            to_cache = labor_market.session_finished(session_players)
+
+        # Header rows are skipped, they are written once by the main process
+        rows = {
+            'labor_market': labor_rows,
+            'outro_quiz': islice(outro_quiz.custom_export(outro_players), 1, None),
+        }
+        # Sanitized here, so that only plain values are sent back to the main process
+        return {app_name: [[sanitize_for_csv(value) for value in row] for row in app_rows]
+                for app_name, app_rows in rows.items()}, to_cache
+
+
+def run_job(outdir, session_codes, workers):
+    from otree.database import session_scope
+    from labor_market import cache_export_rows, export_hiring_steps, export_sessions
+
+    # Snapshot of the sessions to export. Every session gets the hiring columns of the largest market among them
+    with session_scope():
+        sessions = export_sessions(session_codes).all()
+        session_codes = [session.code for session in sessions]
+        hiring_steps = export_hiring_steps(sessions)
+        headers = job_headers(hiring_steps)
+
+    os.makedirs(outdir, exist_ok=True)
+    paths = {app_name: os.path.join(outdir, f'{app_name}.csv') for app_name in JOB_APPS}
+    files = {app_name: open(f'{path}.part', 'w', newline='', encoding='utf-8') for app_name, path in paths.items()}
+    writers = {app_name: csv.writer(outf) for app_name, outf in files.items()}
+    for app_name, header in headers.items():
+        writers[app_name].writerow(header)
+
+    # "spawn" gives every worker its own database connection, instead of sharing the one of this process. Workers
+    # only read: the export cache is written by this process alone, one session at a time, since parallel writers
+    # fail with "database is locked" on SQLite
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context('spawn'), initializer=setup) as pool:
+        # Results come back in session order, so the files have the same row order as the other exports
+        results = zip(session_codes, pool.map(partial(job_session_rows, hiring_steps), session_codes))
+        for done, (session_code, (session_rows, to_cache)) in enumerate(results, start=1):
+            for app_name, rows in session_rows.items():
+                writers[app_name].writerows(rows)
+            if to_cache:
+                with session_scope():
+                    cache_export_rows(session_code, hiring_steps, session_rows['labor_market'])
+            print(f'[{done}/{len(session_codes)}] exported session {session_code}', file=sys.stderr, flush=True)
+
+    for app_name, outf in files.items():
+        outf.close()
+        os.replace(f'{paths[app_name]}.part', paths[app_name])
+        print(f'wrote {paths[app_name]}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Export labor_market data (see the top of this file)')
+    parser.add_argument('outfile', help='outfile.csv or outfile.npz, or the output directory with --job')
+    parser.add_argument('session_codes', nargs='*', help='sessions to export (default: all)')
+    parser.add_argument('--job', action='store_true', help='export all apps of the job in worker processes')
+    parser.add_argument('--workers', type=int, default=2, help='number of worker processes for --job')
+    args = parser.parse_args()
+
+    setup()
+    if args.job:
+        run_job(args.outfile, args.session_codes or None, args.workers)
+    else:
+        export_file(args.outfile, args.session_codes or None)
@@ -5,6 +5,9 @@ from typing import List
 from otree.api import *
 from otree.currency import RealWorldCurrency
 
+import event_log
+import market
+from economics import economics_for
 from intro_quiz.quiz import *
 
 # Constants
@@ -20,30 +23,7 @@ class C(BaseConstants):
 
     NUM_ROUNDS = 1
     NAME_IN_URL = "intro_quiz"
-    PLAYERS_PER_GROUP = None
-
-    MANAGER1_ROLE = "Manager"
-    MANAGER2_ROLE = "Manager"
-    MANAGER3_ROLE = "Manager"
-    MANAGER4_ROLE = "Manager"
-    MANAGER5_ROLE = "Manager"
-    MANAGER6_ROLE = "Manager"
-    EMPLOYEE1_ROLE = "Employee"
-    EMPLOYEE2_ROLE = "Employee"
-    EMPLOYEE3_ROLE = "Employee"
-    EMPLOYEE4_ROLE = "Employee"
-    EMPLOYEE5_ROLE = "Employee"
-    EMPLOYEE6_ROLE = "Employee"
-
-def multiplier_to_table_item(mult_tuple: tuple[int, int]):
-    """Prepare multiplier table for template"""
-    index, multiplier = mult_tuple
-
-    return {
-        "level": index + 1,
-        "multiplier": multiplier,
-        "revenue": [effort * multiplier for effort in range(1, 11)]
-    }
+    PLAYERS_PER_GROUP = None # Markets are formed in creating_session() (see market.py)
 
 # Objects
 
@@ -53,29 +33,41 @@ class Subsession(BaseSubsession):
     @property
     def skill_table(self):
         """Prepare skill table for template"""
-        return list(map(
-            multiplier_to_table_item,
-            enumerate(self.session.config["skill_multipliers"])
-        ))
+        return economics_for(self.session).skill_table
 
     @property
     def effort_table(self):
-        return self.session.config["effort_costs"]
+        return economics_for(self.session).effort_costs
+
+    @property
+    def num_managers_text(self) -> str:
+        """Number of employers per market, as written in the instructions"""
+        return market.number_text(market.market_size(self.session.config)[0])
+
+    @property
+    def num_employees_text(self) -> str:
+        """Number of workers per market, as written in the instructions"""
+        return market.number_text(market.market_size(self.session.config)[1])
+
+    @property
+    def heterogeneous_counts_text(self) -> tuple[str, str]:
+        """Numbers of workers starting with skill level 1 and 5 in a heterogeneous market"""
+        skills = market.starting_skills(self.session.config)
+        return market.number_text(skills.count(1)), market.number_text(skills.count(5))
 
 @staticmethod
 def creating_session(subsession: Subsession):
     """Set per-session participant data"""
 
-    # If session config dictates, reshuffle participants randomly
-    if subsession.session.config["randomize_roles"]:
-        subsession.group_randomly()
+    # Form the markets; if session config dictates, reshuffle participants randomly
+    group_matrix = market.form_markets(subsession, shuffle=subsession.session.config["randomize_roles"])
+    skills = market.starting_skills(subsession.session.config)
     for group in subsession.get_groups():
         # Set initial skills according to session config
         for index, player in enumerate(group.employees):
-            player.skill = subsession.session.config["starting_skills"][index]
+            player.skill = skills[index]
 
-    group_matrix = subsession.get_group_matrix()
-    print(f"Group matrix: {group_matrix}")
+    event_log.groups_formed(subsession.session, __name__, group_matrix)
     subsession.session.vars["frozen_matrix"] = group_matrix
 
 
@@ -92,12 +84,13 @@ class Player(BasePlayer):
     def q_2_7_text(self):
         session = self.session
         market = session.config["market"]
+        low, high = self.subsession.heterogeneous_counts_text
 
         return dict(
             homogeneous_low="In the first period, all workers start with a skill level of 1.",
             homogeneous_high="In the first period, all workers start with a skill level of 5.",
-            heterogeneous="In the first period, three workers start with a skill level of 1 "
-                         "and three workers start with a skill level of 5."
+            heterogeneous=f"In the first period, {low} workers start with a skill level of 1 "
+                         f"and {high} workers start with a skill level of 5."
         )[market]
 
     response = models.IntegerField()
@@ -186,28 +179,29 @@ class Instructions4(Page):
 class Instructions5(Page):
     """Intro page with instructions"""
 
-    MARKET_DESCRIPTION = dict(
-        homogeneous_low="all workers start with a skill level of 1",
-        homogeneous_high="all workers start with a skill level of 5",
-        heterogeneous="three workers start with a skill level of 1 and three workers start with a skill level of 5"
-    )
-
     @staticmethod
     def vars_for_template(player: Player):
         """Providing variables for template"""
         session = player.session
         market = session.config["market"]
         skill_multipliers = session.config["skill_multipliers"]
+        low, high = player.subsession.heterogeneous_counts_text
 
+        market_description = dict(
+            homogeneous_low="all workers start with a skill level of 1",
+            homogeneous_high="all workers start with a skill level of 5",
+            heterogeneous=f"{low} workers start with a skill level of 1 "
+                         f"and {high} workers start with a skill level of 5"
+        )
         market_productivity = dict(
             homogeneous_low=f"all workers have a productivity of {skill_multipliers[0]}",
             homogeneous_high=f"all workers have a productivity of {skill_multipliers[4]}",
-            heterogeneous=f"three workers have a productivity of {skill_multipliers[0]} "
-                         f"and three workers have a productivity of {skill_multipliers[4]}"
+            heterogeneous=f"{low} workers have a productivity of {skill_multipliers[0]} "
+                         f"and {high} workers have a productivity of {skill_multipliers[4]}"
         )
 
         return dict(
-            market_description=Instructions5.MARKET_DESCRIPTION[market],
+            market_description=market_description[market],
             market_productivity=market_productivity[market],
             group_id=player.group_id,
             worker_info=f"Your skill level in the first period is <strong>{player.skill}</strong>."
@@ -0,0 +1,25 @@
+"""Bots for the intro_quiz app"""
+from otree.api import Bot, Submission
+
+from . import *
+
+
+class PlayerBot(Bot):
+    """Gives consent and reads through the instructions and quizzes"""
+
+    def play_round(self):
+        yield Consent
+        yield Instructions1
+        yield Instructions2
+        yield Instructions3
+        # Quiz pages are answered and submitted by their scripts, without a next button in the HTML
+        yield Submission(Quiz1, check_html=False)
+        yield Instructions4
+        yield Instructions5
+        yield Instructions6
+        yield Submission(Quiz2, check_html=False)
+        yield Instructions7
+        yield Instructions8
+        yield Instructions9
+        yield Instructions10
+        yield Submission(Quiz3, check_html=False)
@@ -1,13 +1,25 @@
 """Main simulation"""
 from __future__ import annotations
 
+import json
 import random
 from collections import defaultdict
-from functools import partial
-from itertools import chain
-from typing import Self, List, Optional, Any, Iterator
+from functools import cache, partial, cached_property
+from itertools import chain, groupby
+from typing import Self, List, Optional, Any, Iterator, Iterable, Callable
 
+import numpy as np
+import sqlalchemy
 from otree.api import *
+from otree.export import sanitize_for_csv
+from otree.models import Participant, Session
+from otree.models_concrete import CompletedGroupWaitPage
+from sqlalchemy.orm import Mapper, joinedload, object_session
+
+import event_log
+import market
+import query_budget
+from economics import Economics, economics_for
 
 
 # Constants
@@ -17,26 +29,16 @@ class C(BaseConstants):
     NAME_IN_URL = "labor_market"
     NUM_ROUNDS = 10 # Number of periods of simulation
 
-    PLAYERS_PER_GROUP = 12
-    NUM_MANAGERS = 6
-    NUM_EMPLOYEES = 6
-
-    # "Magic" constants (ending with _ROLE) for OTree to instantiate roles
-    MANAGER1_ROLE = "Manager"
-    MANAGER2_ROLE = "Manager"
-    MANAGER3_ROLE = "Manager"
-    MANAGER4_ROLE = "Manager"
-    MANAGER5_ROLE = "Manager"
-    MANAGER6_ROLE = "Manager"
-    EMPLOYEE1_ROLE = "Employee"
-    EMPLOYEE2_ROLE = "Employee"
-    EMPLOYEE3_ROLE = "Employee"
-    EMPLOYEE4_ROLE = "Employee"
-    EMPLOYEE5_ROLE = "Employee"
-    EMPLOYEE6_ROLE = "Employee"
+    # Markets (groups) and roles are formed in creating_session(), with the size of the session config (see market.py)
+    PLAYERS_PER_GROUP = None
 
     # Used in the page sequence
-    HIRING_STEPS = NUM_EMPLOYEES # Max number of repeated attempts at hiring (should equal number of employees)
+    # Max number of repeated attempts at hiring: the number of Employees of the largest market hiring in steps.
+    # Sessions with smaller markets skip the steps they do not need
+    HIRING_STEPS = market.MAX_STEPS_EMPLOYEES
+
+    # Bump whenever the export columns or their contents change, so that cached export rows get recomputed
+    EXPORT_CACHE_VERSION = 2
 
 # Name generators
 
@@ -48,17 +50,39 @@ class EmployeeLabels(ExtraModel):
     """Random labels for Employees"""
     name = models.StringField()
 
-def random_labels():
-    """Returns a random sample of company/employee labels"""
-    company_labels = read_csv("labor_market/names/companies.csv", CompanyLabels)
-    employee_labels = read_csv("labor_market/names/employees.csv", EmployeeLabels)
-
-    return random.sample([label["name"] for label in company_labels], k=C.NUM_MANAGERS) + \
-           random.sample([label["name"] for label in employee_labels], k=C.NUM_EMPLOYEES)
-
-def custom_export(players) -> Iterator[List[str]]:
-    # Header row
-    yield ([
+@cache
+def label_pools() -> tuple[tuple[str, ...], tuple[str, ...]]:
+    """Returns the company and employee labels of the name files, read and checked once per process"""
+    pools = []
+    for path, label_model in [("labor_market/names/companies.csv", CompanyLabels),
+                              ("labor_market/names/employees.csv", EmployeeLabels)]:
+        # Blank and repeated names are dropped, so that every player of a group gets a distinct label
+        names = tuple(dict.fromkeys(label["name"].strip() for label in read_csv(path, label_model)
+                                    if label["name"] and label["name"].strip()))
+        if not names:
+            raise ValueError(f"{path} has no names")
+        pools.append(names)
+    return pools[0], pools[1]
+
+@cache
+def numbered_labels(names: tuple[str, ...], count: int) -> tuple[str, ...]:
+    """Returns at least count distinct labels: the names, followed by numbered ones ("Red 2", "Red 3", ...) if
+    there are fewer names than count"""
+    repeats = -(-count // len(names))
+    return names + tuple(f"{name} {number}" for number in range(2, repeats + 1) for name in names)
+
+def random_labels(num_groups: int, rng: random.Random, num_managers: int, num_employees: int) -> List[List[str]]:
+    """Returns a random sample of company/employee labels for each of num_groups groups"""
+    company_labels, employee_labels = label_pools()
+    company_labels = numbered_labels(company_labels, num_managers)
+    employee_labels = numbered_labels(employee_labels, num_employees)
+
+    return [rng.sample(company_labels, k=num_managers) + rng.sample(employee_labels, k=num_employees)
+            for _ in range(num_groups)]
+
+def export_header(hiring_steps: int) -> List[str]:
+    """Header row of the labor_market export, with columns for hiring_steps steps per period"""
+    return ([
                "labor_market.session_id",
                "labor_market.player.id_in_group",
                "labor_market.player.role",
@@ -70,7 +94,7 @@ def custom_export(players) -> Iterator[List[str]]:
                for period in range(1, C.NUM_ROUNDS + 1)
                    for header in ([f"labor_market.player.employee_skill.{period}"] +
                              [f"{name}.{period}.{step}"
-                              for step in range(1, C.HIRING_STEPS + 1)
+                              for step in range(1, hiring_steps + 1)
                               for name in ["labor_market.player.offer_decision",
                                            "labor_market.player.offer_employee",
                                            "labor_market.player.offer_wage",
@@ -87,50 +111,219 @@ def custom_export(players) -> Iterator[List[str]]:
                               f"labor_market.player.worker_costofeffort.{period}",
                               f"labor_market.player.worker_productivity.{period}"])
           ] + ["labor_market.player.participant_payoff"])
-    grouped_players = defaultdict(list)
-
-    for player in players:
-        grouped_players[player.session.id].append(player)
 
-    sorted_grouped_players = [grouped_players[session_id] for session_id in sorted(grouped_players)]
-
-    for session_players in sorted_grouped_players:
-        yield from export_for_session_players(session_players)
-
-
-def export_for_session_players(session_players: list[Any]):
-    session_players_last_period = [player for player in session_players if player.round_number == C.NUM_ROUNDS]
+def custom_export(players) -> Iterator[List[str]]:
+    # Players are passed in by id; process them one session at a time
+    sessions = [list(session_players) for _, session_players in
+                groupby(sorted(players, key=lambda p: (p.session_id, p.id)), key=lambda p: p.session_id)]
+    hiring_steps = export_hiring_steps(session_players[0].session for session_players in sessions)
 
-    for final_player in session_players_last_period:
-        result = [
-            final_player.session.code,
-            final_player.id_in_group,
-            final_player.role,
-            final_player.label,
-            final_player.participant.code
-        ]
+    # Header row
+    yield export_header(hiring_steps)
+
+    for session_players in sessions:
+        yield from session_export_rows(session_players[0].session, hiring_steps, lambda: session_players)
+
+def export_sessions(session_codes: Optional[List[str]] = None):
+    """Query for the sessions to export, in creation order (all sessions if no session codes are given)"""
+    sessions = Session.objects_filter().order_by(Session.id)
+    if session_codes is not None:
+        sessions = sessions.filter(Session.code.in_(session_codes))
+    return sessions
+
+def stream_export(session_codes: Optional[List[str]] = None,
+                  hiring_steps: Optional[int] = None) -> Iterator[List[str]]:
+    """Export sessions one at a time, loading each session's players only when it is its turn.
+
+    Rows are yielded as soon as they are built, and nothing of a session is kept once its rows are out, so memory
+    stays flat regardless of how many sessions are exported. Exports all sessions if no session codes are given.
+    The hiring columns fit the largest market of the exported sessions, unless hiring_steps is given."""
+    # Sessions are listed first, for the number of hiring steps. Their players are still loaded one session at a time
+    sessions = export_sessions(session_codes).all()
+    if hiring_steps is None:
+        hiring_steps = export_hiring_steps(sessions)
+    yield export_header(hiring_steps)
+
+    for session in sessions:
+        yield from session_export_rows(session, hiring_steps, partial(load_session_players, session.id))
+
+def session_hiring_steps(session: Session) -> int:
+    """Number of hiring steps of a session (and of its export columns per period): a Manager makes at most one
+    offer per Employee of their market"""
+    return market.market_size(session.config)[1]
+
+def export_hiring_steps(sessions: Iterable[Session]) -> int:
+    """Number of hiring steps in the export columns: enough for the largest market of the exported sessions"""
+    return max((session_hiring_steps(session) for session in sessions), default=market.NUM_EMPLOYEES)
+
+def load_session_players(session_id: int) -> list[Player]:
+    """All players (all rounds) of a session, ready to be exported"""
+    session_players = Player.objects_filter(session_id=session_id).order_by(Player.id).all()
+    for player in session_players:
+        # Same as in oTree's own export: allow reading fields that are still None
+        player._is_frozen = False
+    return session_players
+
+
+# Export cache
+
+class ExportCache(ExtraModel):
+    """Export rows of a finished session, computed once and reused by every later export"""
+    session_code = models.StringField()
+    version = models.IntegerField()
+    hiring_steps = models.IntegerField() # Hiring steps of the rows (see export_hiring_steps())
+    rows = models.LongStringField() # JSON list of rows, already sanitized for CSV
+
+def session_export_rows(session: Session, hiring_steps: int,
+                        load_players: Callable[[], list[Player]]) -> Iterator[List[str]]:
+    """Export rows of a session with hiring_steps steps per period, from the cache if the session is finished and was
+    exported before.
+
+    Players are only loaded (by calling load_players) if the rows are not cached yet. Rows of sessions that are
+    finished get cached on the way out; rows of running sessions are always recomputed, since they can still change."""
+    rows = cached_export_rows(session.code, hiring_steps)
+    if rows is not None:
+        yield from rows
+        return
+
+    session_players = load_players()
+    if not session_finished(session_players):
+        yield from export_for_session_players(session_players, hiring_steps)
+        return
+
+    rows = [[sanitize_for_csv(value) for value in row]
+            for row in export_for_session_players(session_players, hiring_steps)]
+    cache_export_rows(session.code, hiring_steps, rows)
+    yield from rows
+
+def cached_export_rows(session_code: str, hiring_steps: int) -> Optional[list[list]]:
+    """Cached export rows of a session with hiring_steps steps per period, or None if they are not cached"""
+    cache = ExportCache.objects_filter(session_code=session_code, version=C.EXPORT_CACHE_VERSION,
+                                       hiring_steps=hiring_steps).first()
+    return None if cache is None else json.loads(cache.rows)
+
+def cache_export_rows(session_code: str, hiring_steps: int, rows: list[list]):
+    """Cache the export rows of a finished session, sanitized for CSV"""
+    ExportCache.create(session_code=session_code, version=C.EXPORT_CACHE_VERSION, hiring_steps=hiring_steps,
+                       rows=json.dumps(rows))
+
+def session_finished(session_players: list[Any]) -> bool:
+    """Whether all participants of the session are done with the last period: paid, and past PeriodResults"""
+    final_players = [player for player in session_players if player.round_number == C.NUM_ROUNDS]
+    return bool(final_players) and all(player.payoff_calculated and player.results_seen for player in final_players)
+
+
+def long_export(session_codes: Optional[List[str]] = None) -> dict[str, np.ndarray]:
+    """Typed, long-format export as NumPy columns, ready to be written with np.savez_compressed.
+
+    "offers.*" columns hold one row per offer, "periods.*" columns one row per player and period. Players are
+    identified by session code and id_in_group; earnings are NaN for offers that did not become a finished contract.
+    Rows are read as plain tuples (no ORM objects), one query for players and one for offers per session."""
+    offers = defaultdict(list)
+    periods = defaultdict(list)
+
+    for session in export_sessions(session_codes):
+        players = {
+            row.id: row for row in Player.objects_filter(session_id=session.id)
+                                         .join(Participant, Player.participant_id == Participant.id)
+                                         .order_by(Player.id)
+                                         .with_entities(Player.id, Player.group_id, Player.id_in_group, Player._role,
+                                                        Player.round_number, Player.skill, Player._payoff,
+                                                        Player.player_matched, Player.offer_none, Participant.code)
+        }
+        for player in players.values():
+            periods["session"].append(session.code)
+            periods["participant"].append(player.code)
+            periods["id_in_group"].append(player.id_in_group)
+            periods["role"].append(player._role)
+            periods["period"].append(player.round_number)
+            periods["skill"].append(player.skill or 0)
+            periods["payoff"].append(float(player._payoff or 0))
+            periods["counterparty"].append(player.player_matched or 0)
+            periods["offer_none"].append(bool(player.offer_none))
+
+        session_offers = (Offer.objects_filter(Offer.group_id.in_({player.group_id for player in players.values()}))
+                               .order_by(Offer.id)
+                               .with_entities(Offer.period, Offer.step, Offer.manager_id, Offer.employee_id,
+                                              Offer.wage, Offer.training, Offer.accepted, Offer.rejected,
+                                              Offer.effort, Offer.revenue)
+                               .all())
+        skill = np.array([players[offer.employee_id].skill for offer in session_offers], dtype=np.int64)
+        effort = np.array([offer.effort for offer in session_offers], dtype=np.int64)
+        wage = np.array([float(offer.wage) for offer in session_offers], dtype=np.float64)
+        training = np.array([bool(offer.training) for offer in session_offers], dtype=bool)
+        accepted = np.array([bool(offer.accepted) for offer in session_offers], dtype=bool)
+        employee_earnings, manager_earnings, _ = economics_for(session).contract_earnings(skill, effort, wage, training)
+        finished = accepted & (effort > 0)
+
+        offers["session"] += [session.code] * len(session_offers)
+        offers["period"] += [offer.period for offer in session_offers]
+        offers["step"] += [offer.step for offer in session_offers]
+        offers["manager"] += [players[offer.manager_id].id_in_group for offer in session_offers]
+        offers["employee"] += [players[offer.employee_id].id_in_group for offer in session_offers]
+        offers["wage"].append(wage)
+        offers["training"].append(training)
+        offers["accepted"].append(accepted)
+        offers["rejected"] += [bool(offer.rejected) for offer in session_offers]
+        offers["effort"].append(effort)
+        offers["revenue"] += [float(offer.revenue or 0) for offer in session_offers]
+        offers["employee_earnings"].append(np.where(finished, employee_earnings, np.nan))
+        offers["manager_earnings"].append(np.where(finished, manager_earnings, np.nan))
+
+    offer_dtypes = dict(session=str, period=np.int16, step=np.int16, manager=np.int16, employee=np.int16,
+                        wage=np.float64, training=bool, accepted=bool, rejected=bool, effort=np.int16,
+                        revenue=np.float64, employee_earnings=np.float64, manager_earnings=np.float64)
+    period_dtypes = dict(session=str, participant=str, id_in_group=np.int16, role=str, period=np.int16,
+                         skill=np.int16, payoff=np.float64, counterparty=np.int16, offer_none=bool)
 
-        players_in_all_periods = final_player.in_all_rounds()
+    return {
+        **{f"offers.{name}": long_export_column(offers[name], dtype) for name, dtype in offer_dtypes.items()},
+        **{f"periods.{name}": np.array(periods[name], dtype=dtype) for name, dtype in period_dtypes.items()}
+    }
 
-        # Get all offers from the database once, to avoid too many queries
-        player_offers: List[Offer] = []
-        for player_in_period in players_in_all_periods:
-            player_offers += Offer.filter(manager=player_in_period) if player_in_period.role == "Manager" \
-                else Offer.filter(employee=player_in_period)
+def long_export_column(values: list, dtype) -> np.ndarray:
+    """Build a column from a list of values or of per-session arrays"""
+    if values and isinstance(values[0], np.ndarray):
+        return np.concatenate(values).astype(dtype)
+    return np.array(values, dtype=dtype)
+
+
+def export_for_session_players(session_players: list[Any], hiring_steps: int) -> Iterator[List[str]]:
+    # All rounds of the same participant, in period order
+    players_by_participant = defaultdict(list)
+    for player in sorted(session_players, key=lambda p: p.round_number):
+        players_by_participant[player.participant_id].append(player)
+
+    # Get all offers and period summaries of the session from the database at once, to avoid too many queries
+    offer_index = index_offers(session_players)
+    summaries = index_period_summaries(players_by_participant.keys())
+
+    for final_player in [player for player in session_players if player.round_number == C.NUM_ROUNDS]:
+        yield list(chain(
+            [
+                final_player.session.code,
+                final_player.id_in_group,
+                final_player.role,
+                final_player.label,
+                final_player.participant.code
+            ],
+            chain.from_iterable(get_period_data(player_in_period, offer_index, summaries.get(player_in_period.id),
+                                                hiring_steps)
+                                for player_in_period in players_by_participant[final_player.participant_id]),
+            [final_player.participant.payoff]
+        ))
 
-        for player_in_period in players_in_all_periods:
-            result += [
-                item
-                for item in [get_player_skill(player_in_period)] + get_hiring_data(player_in_period, player_offers) +
-                            get_work_data(player_in_period, player_offers)
-            ]
-        
-        result += [final_player.participant.payoff]
 
-        yield result
+# Helper methods
 
+def get_period_data(player: Player, offer_index: OfferIndex, summary: Optional[PeriodSummary],
+                    hiring_steps: int) -> Iterator[str]:
+    """Export columns for a single period of a player: skill, then hiring steps, then work phase"""
+    period_offers = get_period_offers(player, offer_index)
 
-# Helper methods
+    yield get_player_skill(player)
+    yield from get_hiring_data(player, period_offers, hiring_steps)
+    yield from get_work_data(player, period_offers, summary)
 
 def get_player_skill(player: Player) -> str:
     if player.role == "Employee":
@@ -138,12 +331,73 @@ def get_player_skill(player: Player) -> str:
     else:
         return ""
 
-def get_work_data(player: Player, player_offers: List[Offer]) -> List[str]:
-    config = player.session.config
-    contracts: List[Offer] = [offer for offer in player_offers if offer.accepted and offer.period == player.round_number]
+class PeriodOffers:
+    """Offers of one player in one period, grouped by hiring step (export helper)"""
+
+    def __init__(self):
+        self.by_step: dict[int, List[Offer]] = {}   # Offers per hiring step, in creation order
+        self.accepted_steps: set[int] = set()       # Hiring steps in which one of the offers was accepted
+        self.contract: Optional[Offer] = None       # Accepted offer of the period, if any
+
+    def add(self, offer: Offer):
+        self.by_step.setdefault(offer.step, []).append(offer)
+        if offer.accepted:
+            self.accepted_steps.add(offer.step)
+            if self.contract is None:
+                self.contract = offer
+
+    @property
+    def has_contract(self) -> bool:
+        return self.contract is not None
+
+# Offers grouped per player (by database id, which is unique across groups and sessions) and period
+OfferIndex = dict[tuple[int, int], PeriodOffers]
+
+NO_OFFERS = PeriodOffers()
+
+def index_offers(session_players: list[Any]) -> OfferIndex:
+    """Load all offers of the players' groups in a single query and group them per player and period"""
+    group_ids = {player.group_id for player in session_players}
+    return build_offer_index(Offer.objects_filter(Offer.group_id.in_(group_ids)).order_by(Offer.id))
+
+def build_offer_index(offers: Iterable[Offer]) -> OfferIndex:
+    """Group offers per player and period, once for the manager and once for the employee of each offer"""
+    offer_index = defaultdict(PeriodOffers)
 
-    if len(contracts) > 0:
-        contract: Offer = contracts[0]
+    for offer in offers:
+        offer_index[offer.manager_id, offer.period].add(offer)
+        offer_index[offer.employee_id, offer.period].add(offer)
+
+    return offer_index
+
+def get_period_offers(player: Player, offer_index: OfferIndex) -> PeriodOffers:
+    """Return the offers of the player in their period"""
+    return offer_index.get((player.id, player.round_number), NO_OFFERS)
+
+def index_period_summaries(participant_ids: Iterable[int]) -> dict[int, PeriodSummary]:
+    """Load the period summaries of participants in a single query, by player id"""
+    summaries = PeriodSummary.objects_filter(PeriodSummary.participant_id.in_(list(participant_ids)))
+    return {summary.player_id: summary for summary in summaries}
+
+def get_work_data(player: Player, period_offers: PeriodOffers, summary: Optional[PeriodSummary] = None) -> List[str]:
+    economics = economics_for(player.session)
+
+    if summary is not None and summary.has_contract:
+        # Settled period. Earnings are recomputed from the tables, since the export records them unrounded
+        wage = int(summary.wage)
+        return [
+            str(summary.partner), # Counterparty
+            str(wage),
+            str(bool_to_int(summary.training)),
+            str(summary.effort),
+            str(economics.employee_payoff(wage, summary.effort)),
+            str(economics.manager_earnings(summary.skill, summary.effort, wage, summary.training)),
+            str(economics.effort_costs[summary.effort - 1]),
+            str(economics.skill_multipliers[summary.skill - 1])
+        ]
+    elif period_offers.has_contract:
+        # Period not settled yet, or settled before period summaries were recorded
+        contract: Offer = period_offers.contract
 
         if contract.effort:
             return [
@@ -153,8 +407,8 @@ def get_work_data(player: Player, player_offers: List[Offer]) -> List[str]:
                 str(contract.effort),
                 str(contract.employee_earnings),
                 str(contract.manager_earnings),
-                str(config["effort_costs"][contract.effort - 1]),
-                str(config["skill_multipliers"][contract.employee.skill - 1])
+                str(economics.effort_costs[contract.effort - 1]),
+                str(economics.skill_multipliers[contract.employee.skill - 1])
             ]
         else:
             # This should only happen if the session was incomplete
@@ -171,19 +425,17 @@ def get_work_data(player: Player, player_offers: List[Offer]) -> List[str]:
     else:
         return [""] * 8
 
-def get_hiring_data(player: Player, player_offers: List[Offer]) -> List[str]:
-    f = partial(get_hiring_data_for_step, player, player_offers)
-    return list(chain.from_iterable(map(f, range(1, C.HIRING_STEPS + 1))))
+def get_hiring_data(player: Player, period_offers: PeriodOffers, hiring_steps: int) -> List[str]:
+    f = partial(get_hiring_data_for_step, player, period_offers)
+    return list(chain.from_iterable(map(f, range(1, hiring_steps + 1))))
 
-def manager_offered_none_on_step(manager: Player, player_offers: List[Offer], step: int) -> bool:
+def manager_offered_none_on_step(period_offers: PeriodOffers, step: int) -> bool:
     # Offered none if no offers are in current step, but they were in the previous step (if it exists).
     # There should not be an accepted contract in the previous step.
-    if any(offer.accepted for offer in player_offers if offer.manager == manager and offer.period == manager.round_number):
-        return False
-    return len([offer for offer in player_offers if offer.manager == manager and offer.period == manager.round_number and offer.step == step]) == 0
+    return not period_offers.has_contract and step not in period_offers.by_step
 
-def get_hiring_data_for_step(player: Player, player_offers: List[Offer], step: int) -> List[str]:
-    offers: List[Offer] = [offer for offer in player_offers if offer.period == player.round_number and offer.step == step]
+def get_hiring_data_for_step(player: Player, period_offers: PeriodOffers, step: int) -> List[str]:
+    offers: List[Offer] = period_offers.by_step.get(step, [])
 
     offer_count = len(offers)
     if offer_count > 0:
@@ -206,12 +458,12 @@ def get_hiring_data_for_step(player: Player, player_offers: List[Offer], step: i
             employee_result = [str(offer_count)]
 
         # Add the information if an offer has been accepted
-        return manager_result + employee_result + [str(bool_to_int(any(offer.accepted for offer in offers)))]
+        return manager_result + employee_result + [str(bool_to_int(step in period_offers.accepted_steps))]
     else:
         # If there is no offer in this period and step.
         # The locations of zeroes and empty values are different to managers and employees
         if player.role == "Manager":
-            return ["0" if manager_offered_none_on_step(player, player_offers, step) else ""] + ["0"] * 3 + ["", "0"]
+            return ["0" if manager_offered_none_on_step(period_offers, step) else ""] + ["0"] * 3 + ["", "0"]
         else:
             return [""] * 4 + ["0", "0"]
 
@@ -222,56 +474,129 @@ def get_player_from_offer(offer: Offer, player_role: str) -> Player:
 def bool_to_int(b: bool) -> int:
     return 1 if b else 0
 
-def calculate_manager_revenue_and_payoff(group: Group, player: BasePlayer, revenue: cu | int, wage: int,
-                                         has_training: bool) -> dict[str, cu | int]:
-    config = group.session.config
-    endowment: int = config["manager_endowment"]
-    if has_training:
-        training_cost = config["training_cost"]
-        training_productivity_multiplier = config["training_productivity_multiplier"]
-        return {
-            "message": (f"Payoff for Employer {player.id_in_group}: {endowment} + "
-                          f"{revenue * training_productivity_multiplier} - {training_cost} - {wage}"),
-            "payoff": endowment + revenue * training_productivity_multiplier - training_cost - wage,
-            "revenue": revenue * training_productivity_multiplier - training_cost
-        }
-    else:
-        return {
-            "message": f"Payoff for Manager {player.id_in_group}: {endowment} + {revenue} - {wage}",
-            "payoff": endowment + revenue - wage,
-            "revenue": revenue
-        }
-
-def multiplier_to_table_item(mult_tuple: tuple[int, int]):
-    """Prepare multiplier table for template"""
-    index, multiplier = mult_tuple
+# Objects
 
-    return {
-        "level": index + 1,
-        "multiplier": multiplier,
-        "revenue": [effort * multiplier for effort in range(1, 11)] # TODO make 1 configurable through base_revenue
-    }
+def settle_payoffs(players: List[Player]):
+    """Calculate and set the payoffs of a period for players of one or more groups (of the same round), in bulk.
+
+    Contracts and participants are loaded with one query each, payoffs of all contracts are computed in one
+    vectorized pass (Economics.contract_earnings()), and results are written back without Player.payoff, which commits the
+    database on every assignment; everything is saved with the rest of the request instead. The outcome of the
+    period is then recorded for every player as a PeriodSummary, all in one INSERT."""
+    economics = economics_for(players[0].session)
+    players_by_id = {player.id: player for player in players}
+
+    contracts = (Offer.objects_filter(Offer.group_id.in_({player.group_id for player in players}),
+                                      period=players[0].round_number, accepted=True)
+                      .order_by(Offer.id)
+                      .all())
+    # Contracts of every player, in one pass over the contracts
+    contracts_by_player = {}
+    for contract in contracts:
+        contracts_by_player.setdefault(contract.manager_id, []).append(contract)
+        contracts_by_player.setdefault(contract.employee_id, []).append(contract)
+    for player in players:
+        player.__dict__["contract"] = single_contract(player, contracts_by_player.get(player.id, []))
+    # Kept by id: the session's identity map only holds on to objects referenced elsewhere, so player.participant
+    # would load each participant again (flushing the changes of the previous players along the way)
+    participants = {participant.id: participant for participant in
+                    Participant.objects_filter(Participant.id.in_([player.participant_id for player in players]))}
+
+    employee_earnings, manager_earnings, revenue = economics.contract_earnings(
+        skill=np.array([players_by_id[contract.employee_id].skill for contract in contracts], dtype=np.int64),
+        effort=np.array([contract.effort for contract in contracts], dtype=np.int64),
+        wage=np.array([float(contract.wage) for contract in contracts], dtype=np.float64),
+        training=np.array([bool(contract.training) for contract in contracts], dtype=bool),
+        round_revenue=True)
+
+    payoffs = {player.id: cu(economics.manager_endowment if player.role == "Manager" else economics.employee_endowment)
+               for player in players}
+    for index, contract in enumerate(contracts):
+        contract.revenue = cu(revenue[index])
+        payoffs[contract.employee_id] = cu(employee_earnings[index])
+        payoffs[contract.manager_id] = cu(manager_earnings[index])
+        if contract.training:
+            players_by_id[contract.employee_id].skill_increase = True
 
-# Objects
+    for player in players:
+        delta = payoffs[player.id] - player.payoff
+        # Same as oTree's Player.payoff setter (which adds the change to participant.payoff as well), without its
+        # db.commit(). Relies on _payoff being the column behind Player.payoff in oTree 5; the bots and
+        # simulate_sessions.py check that participant.payoff stays the sum of the period payoffs
+        player._payoff += delta
+        participants[player.participant_id].payoff += delta
+        player.payoff_calculated = True
+        event_log.payoff_computed(player, payoffs[player.id])
+
+    # Only once every payoff is set, since summaries include the payoff of the other party. Inserted with one
+    # statement: created one by one, every summary is a separate INSERT when the request is saved
+    summaries = []
+    for player in players:
+        contract = player.field_maybe_none("contract")
+        partner = None
+        if contract:
+            partner = players_by_id[contract.employee_id if player.role == "Manager" else contract.manager_id]
+        summaries.append(period_summary_row(player, contract, partner, economics))
+    # A Core INSERT, run in the transaction of the players (object_session() is the ORM session they belong to)
+    object_session(players[0]).execute(PeriodSummary.__table__.insert(), summaries)
+
+def period_summary_row(player: Player, contract: Optional[Offer], partner: Optional[Player],
+                       economics: Economics) -> dict:
+    """Return the PeriodSummary columns of a player for the current period, once payoffs are settled.
+
+    Every row has all columns (empty ones are inserted as NULL), so that the rows of a group are inserted with a
+    single statement."""
+    if contract is None:
+        skill = player.skill if player.role == "Employee" else 0
+        return dict(player_id=player.id, participant_id=player.participant_id, period=player.round_number,
+                    has_contract=False, partner=0, partner_label=None, partner_skill=None, skill=skill,
+                    new_skill=skill, wage=cu(0), training=False, effort=0, revenue=cu(0), productivity_reduction=0,
+                    training_cost=0, effort_cost=0, manager_payoff=None, employee_payoff=None, payoff=player.payoff,
+                    partner_payoff=None)
+
+    manager, employee = (player, partner) if player.role == "Manager" else (partner, player)
+    skill, effort, training = employee.skill, contract.effort, bool(contract.training)
+    return dict(
+        player_id=player.id,
+        participant_id=player.participant_id,
+        period=player.round_number,
+        has_contract=True,
+        partner=partner.id_in_group,
+        partner_label=partner.label,
+        partner_skill=partner.skill,
+        skill=skill,
+        new_skill=min(skill + 1, len(economics.skill_multipliers)) if training else skill,
+        wage=contract.wage,
+        training=training,
+        effort=effort,
+        revenue=cu(economics.revenue[skill - 1][effort - 1]),
+        productivity_reduction=economics.productivity_reduction[skill - 1][effort - 1] if training else 0,
+        training_cost=economics.training_cost if training else 0,
+        effort_cost=economics.effort_costs[effort - 1],
+        manager_payoff=manager.payoff,
+        employee_payoff=employee.payoff,
+        payoff=player.payoff,
+        partner_payoff=partner.payoff
+    )
 
-def calculate_employee_payoff(endowment: int, wage: int, effort_cost: int) -> int:
-    return endowment + wage + effort_cost
 
 class Subsession(BaseSubsession):
     """Subsession object for simulation"""
     @property
     def skill_table(self):
         """Prepare skill table for template"""
-        return list(map(
-            multiplier_to_table_item,
-            enumerate(self.session.config["skill_multipliers"])
-        ))
+        return economics_for(self.session).skill_table
+
+    @property
+    def hiring_steps(self) -> int:
+        """Number of hiring steps of the session (see session_hiring_steps())"""
+        return session_hiring_steps(self.session)
 
     @property
     def skill_distribution(self):
         """Human-readable description of the skill distribution"""
         counts = {}
-        for skill in self.session.config["starting_skills"]:
+        for skill in market.starting_skills(self.session.config):
             counts[skill] = counts.get(skill, 0) + 1
         return ", ".join([f"{counts[skill]} Worker(s) with Skill level {skill}" for skill in counts.keys()])
 
@@ -279,34 +604,49 @@ class Subsession(BaseSubsession):
 def creating_session(subsession: Subsession):
     """Set per-session participant data"""
 
+    config = subsession.session.config
+
     # In the first Period, set labels and reshuffle participants
     if subsession.round_number == 1:
+        if config.get("hiring_mode", "steps") not in HIRING_MODES:
+            raise ValueError(f"hiring_mode must be one of {', '.join(HIRING_MODES)}")
+        if config.get("hiring_mode", "steps") == "steps" and session_hiring_steps(subsession.session) > C.HIRING_STEPS:
+            # The page sequence has a fixed number of hiring steps (see market.MAX_STEPS_EMPLOYEES)
+            raise ValueError(f"Markets of more than {C.HIRING_STEPS} Employees cannot hire in steps, use "
+                             f"hiring_mode=\"live\"")
+
         if "frozen_matrix" in subsession.session.vars:
             # If we had the players set from the previous app, use it
-            subsession.set_group_matrix(subsession.session.vars["frozen_matrix"])
+            market.set_markets(subsession, subsession.session.vars["frozen_matrix"])
         else:
             # If session config dictates, reshuffle participants randomly
-            if subsession.session.config["randomize_roles"]:
-                subsession.group_randomly()
-
-            group_matrix = subsession.get_group_matrix()
-            print(f"Group matrix: {group_matrix}")
+            group_matrix = market.form_markets(subsession, shuffle=config["randomize_roles"])
+            event_log.groups_formed(subsession.session, __name__, group_matrix)
             subsession.session.vars["frozen_matrix"] = group_matrix
 
-        for group in subsession.get_groups():
-            # Set random labels (company names for Managers, nicknames for Employees)
-            labels = random_labels()
+        # Set random labels (company names for Managers, nicknames for Employees). If the session config has a
+        # "label_seed", labels are drawn with a generator seeded with it, so that they can be reproduced.
+        groups = subsession.get_groups()
+        rng = random.Random(config.get("label_seed"))
+        skills = market.starting_skills(config)
+        for group, labels in zip(groups, random_labels(len(groups), rng, *market.market_size(config))):
             for player in group.get_players():
                 player.label = labels[player.id_in_group - 1]
             # Set initial skills according to session config. This should be the same regardless of whether
             # this is the first app or not.
             for index, player in enumerate(group.employees):
-                player.skill = subsession.session.config["starting_skills"][index]
+                player.skill = skills[index]
     else:
-        # In subsequent Periods, retain the same group/role and labels
-        subsession.group_like_round(1)
+        # In subsequent Periods, retain the same group/role and labels. Players are usually grouped that way already
+        # (unless roles were randomized, or there are several markets), and regrouping recreates every group of the
+        # period, so it is skipped then. Roles are set either way, since oTree has no role constants to go by
+        if subsession.get_group_matrix() != subsession.in_round(1).get_group_matrix():
+            subsession.group_like_round(1)
+        market.assign_roles(subsession)
+        first_round = Player.objects_filter(session_id=subsession.session.id, round_number=1)
+        labels = dict(first_round.with_entities(Player.participant_id, Player.label))
         for player in subsession.get_players():
-            player.label = player.in_round(1).label
+            player.label = labels[player.participant_id]
 
 
 class Player(BasePlayer):
@@ -322,6 +662,8 @@ class Player(BasePlayer):
     offer_step        = models.IntegerField(initial=1)
     # Whether the payoff is already calculated for the Period
     payoff_calculated = models.BooleanField(initial=False)
+    # Whether the player went on from the results of the Period
+    results_seen      = models.BooleanField(initial=False)
 
     ### Form fields
 
@@ -346,7 +688,7 @@ class Player(BasePlayer):
 
     def rejected_from(self, manager: Self) -> bool:
         """Returns True/False whether the Employee player rejected an offer from a given Manager"""
-        return len(Offer.filter(employee=self, manager=manager, rejected=True)) > 0
+        return bool(self.group.hiring_masks["rejected"].get(str(manager.id_in_group), 0) & player_bit(self))
 
     def choice_id(self, manager: Self) -> int:
         """Returns the ID of the possible offer for a given Manager, or -1 if ineligible. Required for a combined table of eligible/ineligible employees."""
@@ -357,17 +699,13 @@ class Player(BasePlayer):
 
     def for_hire(self):
         """Return all Employee players still open for offer from this manager"""
-        # Rejected binding offers
-        my_offers_rejected = Offer.filter(manager=self, rejected=True)
+        eligible = self.group.eligible_mask(self)
+        return [employee for employee in self.group.employees if eligible & player_bit(employee)]
 
-        return [
-            employee
-            for employee in self.group.employees                                  # Check all employees in the group
-            if not employee.player_matched                                        # Must not have an accepted employer
-            and employee not in (offer.employee for offer in my_offers_rejected)  # Must not have rejected manager's offer
-        ]
+    # Derived offer data below is memoized on the Player object with cached_property. oTree loads fresh objects for
+    # every request, so the memoized values live for one request; forget_offers() drops them when offers change.
 
-    @property
+    @cached_property
     def contract(self) -> Optional[Offer]:
         """Return accepted Offer, or return None"""
         if self.role == "Manager":
@@ -375,33 +713,40 @@ class Player(BasePlayer):
         else:
             accepted_offers = Offer.filter(employee=self, accepted=True)
 
-        if len(accepted_offers) == 1:
-            return accepted_offers[0]
-        if len(accepted_offers) == 0:
-            return None
+        return single_contract(self, accepted_offers)
+
+    def participant_offers(self) -> sqlalchemy.orm.Query:
+        """Return a query for the offers of the participant (in every period), ordered by period and step.
 
-        raise RuntimeError(f"Player {self.id_in_group} does not have exactly one accepted offer")
+        Offers link to the participant as well as to the player of their period, so that all periods are found
+        with one range scan of a (participant, period, step) index."""
+        if self.role == "Manager":
+            participant_link = Offer.manager_participant_id
+        else:
+            participant_link = Offer.employee_participant_id
+        return (Offer.objects_filter(participant_link == self.participant_id)
+                     .order_by(Offer.period, Offer.step, Offer.id))
 
     def get_offers_last_round(self) -> Iterator[Offer]:
         """Yield all (non-open) offers for the participant across this+previous periods"""
-        for i, player in enumerate(self.in_all_rounds()):
-            if self.role == "Manager":
-                for offer in Offer.filter(manager=player, period=self.round_number):
-                    yield offer
-            else:
-                for offer in Offer.filter(employee=player, period=self.round_number):
-                    yield offer
+        yield from self.participant_offers().filter(Offer.period == self.round_number)
 
-    @property
+    @cached_property
     def offer_history(self) -> List[Offer]:
-        """Return a history of all (non-open) offers for the participant across this+previous periods"""
-        offer_history = []
+        """Return a history of all (non-open) offers for the participant across this+previous periods.
 
-        for player in self.in_all_rounds():
-            if self.role == "Manager":
-                offer_history += Offer.filter(manager=player)
-            else:
-                offer_history += Offer.filter(employee=player)
+        All periods are loaded in one query, together with the other party of each offer. The contract of this
+        period is memoized along the way, so reading player.contract afterwards needs no further query."""
+        offer_history = (self.participant_offers()
+                             .filter(Offer.period <= self.round_number)
+                             .options(joinedload(Offer.manager), joinedload(Offer.employee))
+                             .all())
+
+        if "contract" not in self.__dict__:
+            accepted_offers = [offer for offer in offer_history
+                               if offer.accepted and offer.period == self.round_number]
+            if len(accepted_offers) <= 1:
+                self.__dict__["contract"] = single_contract(self, accepted_offers)
 
         ## Remove open offers (only really matters for Employees)
         #offer_history = [offer for offer in offer_history if offer.accepted or offer.rejected]
@@ -409,6 +754,21 @@ class Player(BasePlayer):
         # Reverse the list of offers: most recent first
         return list(reversed(offer_history))
 
+    @cached_property
+    def period_summaries(self) -> List[PeriodSummary]:
+        """Return the summaries of all settled periods of the participant, in period order"""
+        return (PeriodSummary.objects_filter(participant_id=self.participant_id)
+                             .order_by(PeriodSummary.period)
+                             .all())
+
+    @property
+    def period_summary(self) -> Optional[PeriodSummary]:
+        """Return the summary of this period, or None if it is not settled yet"""
+        for summary in self.period_summaries:
+            if summary.period == self.round_number:
+                return summary
+        return None
+
     @property
     def payoff_history(self) -> List[int]:
         """Return a history of payoffs for all periods."""
@@ -420,6 +780,69 @@ class Player(BasePlayer):
         return payoff_history
 
 
+def single_contract(player: Player, accepted_offers: List[Offer]) -> Optional[Offer]:
+    """Return the only accepted offer of a player in a period, or None"""
+    if len(accepted_offers) == 1:
+        return accepted_offers[0]
+    if len(accepted_offers) == 0:
+        return None
+
+    raise RuntimeError(f"Player {player.id_in_group} does not have exactly one accepted offer")
+
+def forget_offers(*players: Player):
+    """Drop the memoized offer data of players, after an offer of theirs was created or accepted"""
+    for player in players:
+        for name in ("contract", "offer_history"):
+            player.__dict__.pop(name, None)
+
+def make_offer(manager: Player, employee: Player) -> Offer:
+    """Create an offer to an Employee from the offer fields of a Manager, in the Manager's current hiring step"""
+    offer = Offer.create(
+        manager=manager,
+        employee=employee,
+        group=manager.group,
+        session=manager.session,
+        manager_participant=manager.participant,
+        employee_participant=employee.participant,
+        wage=manager.offer_wage,
+        training=manager.offer_training,
+        period=manager.round_number,
+        step=manager.offer_step
+    )
+    manager.group.add_open_offer(manager, employee)
+    forget_offers(manager, employee)
+    event_log.offer_made(offer)
+    return offer
+
+def accept_offer(employee: Player, manager: Optional[Player]):
+    """Accept the open offer of a Manager (None to accept none) and reject all other open offers of an Employee"""
+    # With their Managers, which the event log and the hiring masks need for every offer
+    open_offers = (Offer.objects_filter(employee=employee, accepted=False, rejected=False)
+                        .options(joinedload(Offer.manager))
+                        .order_by(Offer.id)
+                        .all())
+
+    if manager is not None:
+        employee.player_matched = manager.id_in_group
+        manager.player_matched = employee.id_in_group
+
+        offers = [offer for offer in open_offers if offer.manager_id == manager.id]
+        assert len(offers) == 1
+        accepted_offer = offers[0]
+        open_offers.remove(accepted_offer)
+
+        accepted_offer.accepted = True
+        forget_offers(manager, employee)
+        employee.offer_wage = accepted_offer.wage
+        employee.offer_training = accepted_offer.training
+        event_log.offer_accepted(accepted_offer)
+
+    for offer in open_offers:
+        offer.rejected = True
+        event_log.offer_rejected(offer)
+
+    employee.group.resolve_offers(employee, manager, [offer.manager for offer in open_offers])
+
 def offer_wage_max(player: Player):
     return player.session.config["max_wage"]
 
@@ -430,24 +853,114 @@ def offer_employee_choices(manager: Player):
 
 def player_matched_choices(employee: Player):
     """Dynamically provide offer choices"""
-    open_offers = Offer.filter(employee=employee, accepted=False, rejected=False)
-    manager_ids = [offer.manager.id_in_group for offer in open_offers]
+    manager_ids = players_in_mask(employee.group.open_offers_mask(employee))
 
     return manager_ids + [0] # It's always possible to reject all offers with 0
 
 
+def player_bit(player: Player) -> int:
+    """Bit of a player in the hiring bitmasks of the group"""
+    return 1 << (player.id_in_group - 1)
+
+def players_in_mask(mask: int) -> List[int]:
+    """Return the id_in_group of the players whose bits are set in a hiring bitmask"""
+    return [index + 1 for index in range(mask.bit_length()) if mask >> index & 1]
+
+
 class Group(BaseGroup):
     """Group object for simulation"""
+    # Hiring state of the current period, as bitmasks over players (see player_bit()): "matched" has the
+    # employees with a contract, "rejected" has, per manager id_in_group, the employees who rejected that
+    # manager's offer, and "open" has, per employee id_in_group, the managers with an open offer to that employee.
+    # Kept up to date as offers are made in MakeOffer and resolve in GetOffers, so that checking who a manager can
+    # still make an offer to, or whether an employee has open offers, needs no queries.
+    # Stored as JSON, since Python ints outgrow an IntegerField in larger markets.
+    hiring_masks_json = models.LongStringField(initial='{"matched": 0, "rejected": {}, "open": {}}')
+    # Whether no Manager can hire anymore in this period (see market_closed()). Set after each hiring step, so that
+    # the remaining steps are skipped, and on the live market once it closes.
+    market_cleared = models.BooleanField(initial=False)
+
+    @cached_property
+    def players(self) -> List[Player]:
+        """Return the players of the group, in id_in_group order.
+
+        Loaded once per request (like the cached properties of Player), since wait page callbacks and the live
+        market read the players, Managers and Employees of a group several times; get_players() queries every time."""
+        return self.get_players()
 
     @property
     def managers(self) -> List[Player]:
         """Return all Manager players from the current group"""
-        return [player for player in self.get_players() if player.role == "Manager"]
+        return [player for player in self.players if player.role == "Manager"]
 
     @property
     def employees(self) -> List[Player]:
         """Return all Employee players from the current group"""
-        return [player for player in self.get_players() if player.role == "Employee"]
+        return [player for player in self.players if player.role == "Employee"]
+
+    @property
+    def employees_mask(self) -> int:
+        """Return the bitmask of all Employees of the group (the players after the Managers, see market.py)"""
+        num_managers, num_employees = market.market_size(self.session.config)
+        return ((1 << num_employees) - 1) << num_managers
+
+    @property
+    def hiring_masks(self) -> dict:
+        """Return the hiring eligibility bitmasks of the current hiring step (read-only).
+
+        Parsed once for every state of hiring_masks_json, since pages and the live market read the masks once per
+        Manager or Employee; with large markets, parsing them every time grows with the square of the market size."""
+        source, masks = self.__dict__.get("_hiring_masks", (None, None))
+        if source is not self.hiring_masks_json:
+            masks = json.loads(self.hiring_masks_json)
+            self.__dict__["_hiring_masks"] = (self.hiring_masks_json, masks)
+        return masks
+
+    def updated_hiring_masks(self) -> dict:
+        """Return a copy of the hiring bitmasks to update (and save back to hiring_masks_json)"""
+        return json.loads(self.hiring_masks_json)
+
+    def eligible_mask(self, manager: Player) -> int:
+        """Return the bitmask of employees that a Manager can still make an offer to"""
+        masks = self.hiring_masks
+        return ~(masks["matched"] | masks["rejected"].get(str(manager.id_in_group), 0))
+
+    def open_offers_mask(self, employee: Player) -> int:
+        """Return the bitmask of managers with an open offer to an Employee"""
+        return self.hiring_masks["open"].get(str(employee.id_in_group), 0)
+
+    def has_open_offer(self, manager: Player) -> bool:
+        """Return whether a Manager has an offer that is still open"""
+        return any(mask & player_bit(manager) for mask in self.hiring_masks["open"].values())
+
+    def add_open_offer(self, manager: Player, employee: Player):
+        """Update the hiring bitmasks once a Manager has made an offer to an Employee"""
+        masks = self.updated_hiring_masks()
+        key = str(employee.id_in_group)
+        masks["open"][key] = masks["open"].get(key, 0) | player_bit(manager)
+        self.hiring_masks_json = json.dumps(masks)
+
+    def resolve_offers(self, employee: Player, manager_accepted: Optional[Player], managers_rejected: List[Player]):
+        """Update the hiring bitmasks once an Employee has accepted and/or rejected all open offers"""
+        masks = self.updated_hiring_masks()
+        masks["open"].pop(str(employee.id_in_group), None)
+        if manager_accepted is not None:
+            masks["matched"] |= player_bit(employee)
+        for manager in managers_rejected:
+            key = str(manager.id_in_group)
+            masks["rejected"][key] = masks["rejected"].get(key, 0) | player_bit(employee)
+        self.hiring_masks_json = json.dumps(masks)
+
+    def reject_offer(self, employee: Player, manager: Player):
+        """Update the hiring bitmasks once an Employee has rejected the open offer of one Manager (live market)"""
+        masks = self.updated_hiring_masks()
+        key = str(employee.id_in_group)
+        masks["open"][key] = masks["open"].get(key, 0) & ~player_bit(manager)
+        if masks["open"][key] == 0:
+            del masks["open"][key]
+        manager_key = str(manager.id_in_group)
+        masks["rejected"][manager_key] = masks["rejected"].get(manager_key, 0) | player_bit(employee)
+        self.hiring_masks_json = json.dumps(masks)
 
 
 # Extra models
@@ -459,6 +972,9 @@ class Offer(ExtraModel):
     manager  = models.Link(Player)                 # Manager that made the offer
     employee = models.Link(Player)                 # Employee to which the offer was made
     group    = models.Link(Group)                  # Group that the Manager/Employee belonged to
+    session  = models.Link(Session)                # Session of the offer
+    manager_participant  = models.Link(Participant) # Participant of the Manager (the same in every period)
+    employee_participant = models.Link(Participant) # Participant of the Employee (the same in every period)
     wage     = models.CurrencyField()              # Offered wage
     training = models.BooleanField()               # Whether training is included
     accepted = models.BooleanField(initial=False)  # True if Employee accepted (offer becomes contract)
@@ -470,7 +986,7 @@ class Offer(ExtraModel):
     def effort_cost(self):
         """Return cost of effort (negative) for selected effort"""
         if self.effort > 0:
-            return -cu(self.manager.session.config["effort_costs"][self.effort - 1]) # pylint: disable=no-member
+            return -cu(economics_for(self.group.session).effort_costs[self.effort - 1])
         else:
             return 0
 
@@ -478,33 +994,243 @@ class Offer(ExtraModel):
     def manager_costs(self):
         """Return costs to the manager (negative) which is wage + training"""
         if self.training > 0:
-            return -(self.wage + cu(self.manager.session.config["training_cost"])) # pylint: disable=no-member
+            return -(self.wage + cu(economics_for(self.group.session).training_cost))
         else:
             return -self.wage
 
     @property
     def employee_earnings(self) -> int:
-        config = self.group.session.config
-        return calculate_employee_payoff(config["employee_endowment"], int(self.wage),
-                                         -config["effort_costs"][self.effort - 1])
+        return economics_for(self.group.session).employee_payoff(int(self.wage), self.effort)
 
     @property
     def manager_earnings(self) -> int:
-        config = self.group.session.config
-        effort = self.effort
-        skill_multiplier = config["skill_multipliers"][self.employee.skill - 1]
-        base_revenue = config["base_revenue"]
-        initial_revenue = base_revenue * skill_multiplier * effort
+        return economics_for(self.group.session).manager_earnings(self.employee.skill, self.effort, int(self.wage),
+                                                                  self.training)
+
+class PeriodSummary(ExtraModel):
+    """Outcome of a period for one player, recorded once when payoffs are settled (see settle_payoffs()).
+
+    PeriodResults, the sidebar and the export read it instead of looking up the contract, the other party and the
+    config again. Costs are positive amounts; without a contract, the contract fields are 0 or empty."""
+    player        = models.Link(Player)
+    participant   = models.Link(Participant)
+    period        = models.IntegerField()
+    has_contract  = models.BooleanField()
+    partner       = models.IntegerField()   # id_in_group of the other party of the contract (0 without a contract)
+    partner_label = models.StringField()
+    partner_skill = models.IntegerField()
+    skill         = models.IntegerField()   # Skill of the Employee of the contract (own skill for Employees without)
+    new_skill     = models.IntegerField()   # Skill of that Employee in the next period
+    wage          = models.CurrencyField()
+    training      = models.BooleanField()
+    effort        = models.IntegerField()
+    revenue       = models.CurrencyField()  # Revenue from the Employee's productivity, before training costs
+    productivity_reduction = models.IntegerField()
+    training_cost = models.IntegerField()
+    effort_cost   = models.IntegerField()
+    manager_payoff  = models.CurrencyField()
+    employee_payoff = models.CurrencyField()
+    payoff          = models.CurrencyField()
+    partner_payoff  = models.CurrencyField()
+
+
+# Database indexes
+
+# Composite indexes for the lookups of offers by the pages (offers of an employee or a manager, by status), by
+# settle_payoffs() and the export (offers of groups, by period), and of the period summaries of a participant
+# (sidebar). The last three serve the wait pages, which oTree runs per group: the players of a group (oTree's own
+# lookups and Group.players), the players of the previous period (WaitForAllPlayers), and whether a group completed
+# a wait page. Without them, these scan every player or completion of the database, so that the barrier of a group
+# gets slower with every other group. Names are prefixed with the table name, since PostgreSQL needs them to be
+# unique in the database.
+INDEXES = [
+    (Offer, "labor_market_offer_employee_status", ["employee_id", "accepted", "rejected"]),
+    (Offer, "labor_market_offer_manager_status", ["manager_id", "accepted", "rejected"]),
+    (Offer, "labor_market_offer_group_period", ["group_id", "period", "accepted"]),
+    (Offer, "labor_market_offer_manager_history", ["manager_participant_id", "period", "step"]),
+    (Offer, "labor_market_offer_employee_history", ["employee_participant_id", "period", "step"]),
+    (PeriodSummary, "labor_market_periodsummary_participant", ["participant_id", "period"]),
+    (Player, "labor_market_player_group", ["group_id"]),
+    (Player, "labor_market_player_participant_round", ["participant_id", "round_number"]),
+    (CompletedGroupWaitPage, "otree_completedgroupwaitpage_group_page", ["group_id", "page_index"]),
+]
+
+@sqlalchemy.event.listens_for(Mapper, "after_configured")
+def declare_indexes():
+    """Add the indexes to their tables, so that they are created along with the tables.
+
+    Link columns (e.g. Offer.employee_id) only exist once oTree has configured the models, hence the event."""
+    for model, name, columns in INDEXES:
+        table = model.__table__
+        if name not in {index.name for index in table.indexes}:
+            sqlalchemy.Index(name, *[table.c[column] for column in columns])
+
+@sqlalchemy.event.listens_for(ExtraModel.metadata, "after_create")
+def create_missing_indexes(metadata, connection, **kwargs):
+    """Create the indexes that are missing from tables created before the indexes were declared.
+
+    oTree creates missing tables at startup, but does not add indexes to tables that already exist."""
+    inspector = sqlalchemy.inspect(connection)
+    for model, name, _ in INDEXES:
+        table = model.__table__
+        if name not in {index["name"] for index in inspector.get_indexes(table.name)}:
+            next(index for index in table.indexes if index.name == name).create(connection)
+
+# Live hiring market
+#
+# With the session config hiring_mode="live", a single HiringMarket page replaces the hiring steps: Managers make
+# offers and Employees accept or reject them whenever they like, through oTree's live_method. The rules of the hiring
+# steps are enforced here as well: a Manager has at most one open offer and cannot make another offer to an Employee
+# who rejected theirs, and an Employee accepts at most one offer. The n-th offer of a Manager is recorded in hiring
+# step n, so that the export keeps its columns. After every action only the changes are sent, to the players they
+# concern. The market closes once no Manager can still hire, and everyone still on the page moves on.
+
+HIRING_MODES = ("steps", "live")
+
+def live_hiring(player: Player) -> bool:
+    """Return whether hiring runs on the live market instead of in hiring steps"""
+    return player.session.config.get("hiring_mode", "steps") == "live"
+
+def can_hire(manager: Player) -> bool:
+    """Return whether a Manager without a match can still make (or has open) an offer in this period"""
+    group = manager.group
+    return manager.player_matched == 0 and not manager.offer_none and \
+        (group.eligible_mask(manager) & group.employees_mask) != 0
+
+def market_closed(group: Group) -> bool:
+    """Return whether no Manager of the group can still hire"""
+    return not any(can_hire(manager) for manager in group.managers)
+
+def employee_status(manager: Player, employee: Player) -> str:
+    """Return the status of an Employee for a Manager: available, pending (offer open), rejected, contract (with
+    this Manager) or hired (by another Manager)"""
+    if manager.player_matched == employee.id_in_group:
+        return "contract"
+    if manager.group.open_offers_mask(employee) & player_bit(manager):
+        return "pending"
+    if manager.group.eligible_mask(manager) & player_bit(employee):
+        return "available"
+    return "rejected" if employee.rejected_from(manager) else "hired"
+
+def offer_view(offer: Offer) -> dict:
+    """Open offer as sent to the Employee"""
+    return {"manager": offer.manager.label, "wage": int(offer.wage), "training": bool(offer.training)}
+
+def market_state(player: Player) -> dict:
+    """Return the whole market as seen by a player, for a (re)loaded page"""
+    if player.role == "Manager":
+        state = {
+            "employees": {employee.id_in_group: employee_status(player, employee)
+                          for employee in player.group.employees},
+            "done": not can_hire(player)
+        }
+    else:
+        open_offers = Offer.filter(employee=player, accepted=False, rejected=False)
+        state = {
+            "offers": {offer.manager.id_in_group: offer_view(offer) for offer in open_offers},
+            "done": player.player_matched > 0
+        }
+    state["closed"] = player.group.market_cleared
+    return state
+
+def live_market(player: Player, data: dict) -> dict[int, dict]:
+    """Apply an action of a player on the live market, and return the changes to send, per id_in_group.
+
+    Actions are {"type": "load"} from everyone, {"type": "offer", "employee": id_in_group, "wage": int,
+    "training": bool} and {"type": "none"} from Managers, and {"type": "accept"} or {"type": "reject"} with
+    "manager": id_in_group from Employees. Invalid actions are answered with an "error" to the player only."""
+    group = player.group
+    action = data.get("type")
+    if action == "load" or group.market_cleared:
+        return {player.id_in_group: market_state(player)}
+
+    messages = defaultdict(lambda: defaultdict(dict))
+    try:
+        if player.role == "Manager" and action == "offer":
+            live_offer(player, data, messages)
+        elif player.role == "Manager" and action == "none":
+            if group.has_open_offer(player):
+                raise ValueError("Your offer is still open.")
+            player.offer_none = True
+            messages[player.id_in_group]["done"] = True
+        elif player.role == "Employee" and action in ("accept", "reject"):
+            live_answer(player, action == "accept", data, messages)
+        else:
+            raise ValueError(f"Unknown action {action!r}.")
+    except ValueError as error:
+        return {player.id_in_group: {"error": str(error)}}
+
+    # Managers whose options changed may have run out of workers to hire
+    for manager in group.managers:
+        if manager.id_in_group in messages:
+            messages[manager.id_in_group]["done"] = not can_hire(manager)
+    if market_closed(group):
+        group.market_cleared = True
+        for other in group.players:
+            messages[other.id_in_group]["closed"] = True
+    return messages
+
+def live_offer(manager: Player, data: dict, messages: dict):
+    """Make an offer on the live market"""
+    try:
+        employee_id, wage = int(data["employee"]), int(data["wage"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Select a worker and a salary.") from None
+    if not can_hire(manager):
+        raise ValueError("You cannot make any more offers in this period.")
+    if manager.group.has_open_offer(manager):
+        raise ValueError("Your previous offer is still open.")
+    if employee_id not in [employee.id_in_group for employee in manager.for_hire()]:
+        raise ValueError("This worker is not available for an offer from you.")
+    if not 1 <= wage <= offer_wage_max(manager):
+        raise ValueError(f"The salary must be between 1 and {offer_wage_max(manager)}.")
+
+    manager.offer_employee = employee_id
+    manager.offer_wage = wage
+    manager.offer_training = bool(data.get("training"))
+    offer = make_offer(manager, manager.group.get_player_by_id(employee_id))
+    manager.offer_step += 1
+
+    messages[manager.id_in_group]["employees"][employee_id] = "pending"
+    messages[employee_id]["offers"][manager.id_in_group] = offer_view(offer)
+
+def live_answer(employee: Player, accept: bool, data: dict, messages: dict):
+    """Accept or reject an open offer on the live market"""
+    group = employee.group
+    open_managers = players_in_mask(group.open_offers_mask(employee))
+    try:
+        manager_id = int(data["manager"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("Select an offer.") from None
+    if employee.player_matched > 0:
+        raise ValueError("You have already accepted an offer.")
+    if manager_id not in open_managers:
+        raise ValueError("This offer is no longer open.")
+
+    manager = group.get_player_by_id(manager_id)
+    if accept:
+        # All other open offers get rejected; every Manager sees the Employee as hired, or as having rejected them
+        accept_offer(employee, manager)
+        messages[employee.id_in_group]["offers"].update({other_id: None for other_id in open_managers})
+        messages[employee.id_in_group]["done"] = True
+        for other in group.managers:
+            messages[other.id_in_group]["employees"][employee.id_in_group] = employee_status(other, employee)
+    else:
+        offer = Offer.filter(manager=manager, employee=employee, accepted=False, rejected=False)[0]
+        offer.rejected = True
+        group.reject_offer(employee, manager)
+        forget_offers(manager, employee)
+        event_log.offer_rejected(offer)
+        messages[employee.id_in_group]["offers"][manager_id] = None
+        messages[manager_id]["employees"][employee.id_in_group] = "rejected"
 
-        return calculate_manager_revenue_and_payoff(self.group, self.manager, initial_revenue, int(self.wage),
-                                                    self.training)["payoff"]
 
 # Pages
 
 def stage_counter(player: Player, with_step: bool = False) -> str:
     """Formatted period + stage counter for display in titles"""
     return (f"(Period { player.subsession.round_number }/{ C.NUM_ROUNDS }"
-            + (f" | Step { player.offer_step }/{ C.HIRING_STEPS })" if with_step else ")"))
+            + (f" | Step { player.offer_step }/{ player.subsession.hiring_steps })" if with_step else ")"))
 
 
 class WaitForAllPlayers(WaitPage):
@@ -520,11 +1246,17 @@ class WaitForAllPlayers(WaitPage):
     @staticmethod
     def after_all_players_arrive(group: Group):
         if group.round_number > 1:
-            for player in group.get_players():
-                prev_player = player.in_round(group.round_number - 1)
+            players = group.players
+            # Skills of the previous period of all players in one query
+            previous_players = (Player.objects_filter(Player.participant_id.in_([p.participant_id for p in players]),
+                                                      round_number=group.round_number - 1)
+                                      .with_entities(Player.participant_id, Player.skill, Player.skill_increase))
+            previous_skills = {row.participant_id: row for row in previous_players}
+            for player in players:
+                prev_player = previous_skills[player.participant_id]
                 player.skill = prev_player.skill
                 if prev_player.skill_increase:
-                    player.skill = min(player.skill + 1, len(group.session.config["skill_multipliers"]))
+                    player.skill = min(player.skill + 1, len(economics_for(group.session).skill_multipliers))
 
 class MakeOffer(Page):
     """Hiring phase page. Shown to Managers without an accepted offer who still can hire."""
@@ -533,12 +1265,15 @@ class MakeOffer(Page):
 
     @staticmethod
     def vars_for_template(player):
+        # Same order as offer_employee_choices(), which gives the choice IDs
+        choice_ids = {employee.id_in_group: index for index, employee in enumerate(player.for_hire())}
+
         # List that holds data for building an employee table (both eligible and ineligible)
         employee_pool = [ {
             "employee": employee,
             "rejected": employee.rejected_from(player),
-            "eligible": employee.choice_id(player) >= 0,
-            "choice_id": employee.choice_id(player)
+            "eligible": employee.id_in_group in choice_ids,
+            "choice_id": choice_ids.get(employee.id_in_group, -1)
         } for employee in player.group.employees ]
 
         return {
@@ -554,31 +1289,39 @@ class MakeOffer(Page):
     # and still has eligible candidates
     @staticmethod
     def is_displayed(player: Player):
-        return player.role == "Manager" and \
-               player.player_matched == 0 and \
-               not player.offer_none and \
-               len(player.for_hire()) > 0
+        return not live_hiring(player) and not player.group.market_cleared and \
+            player.role == "Manager" and can_hire(player)
 
     # Create an Offer object based on the submitted data (or lack thereof if timed out)
     @staticmethod
     def before_next_page(manager: Player, timeout_happened: bool):
         if timeout_happened:
-            print(f"Timeout for Employer {manager.id_in_group}, not putting forward any offers")
+            event_log.timeout(manager, "MakeOffer", "no offer made")
         else:
             if manager.offer_employee > 0:
-                employee = manager.group.get_player_by_id(manager.offer_employee)
-                Offer.create(
-                    manager=manager,
-                    employee=employee,
-                    group=manager.group,
-                    wage=manager.offer_wage,
-                    training=manager.offer_training,
-                    period=manager.round_number,
-                    step=manager.offer_step
-                )
+                make_offer(manager, manager.group.get_player_by_id(manager.offer_employee))
             else:
                 manager.offer_none = True
 
+class HiringMarket(Page):
+    """Hiring phase on the live market (hiring_mode="live"), instead of the hiring steps. Shown to everyone until the
+    market closes (see live_market())."""
+    @staticmethod
+    def is_displayed(player: Player):
+        return live_hiring(player)
+
+    @staticmethod
+    def vars_for_template(player: Player):
+        return {
+            "employees": player.group.employees,
+            "offers": player.offer_history,
+            "future_periods": range(player.round_number, C.NUM_ROUNDS + 1)
+        }
+
+    @staticmethod
+    def live_method(player: Player, data: dict):
+        return live_market(player, data)
+
 class WaitForOffers(WaitPage):
     """Wait for offers page"""
     @staticmethod
@@ -591,7 +1334,8 @@ class WaitForOffers(WaitPage):
     # Shown to Employees without a contract
     @staticmethod
     def is_displayed(player):
-        return player.role == "Employee" and player.player_matched == 0
+        return not live_hiring(player) and not player.group.market_cleared and \
+            player.role == "Employee" and player.player_matched == 0
 
 
 class GetOffers(Page):
@@ -612,29 +1356,19 @@ class GetOffers(Page):
     # Shown to Employees without a contract, but with open offers in this step
     @staticmethod
     def is_displayed(player):
-        open_offers = Offer.filter(employee=player, accepted=False, rejected=False)
-        return player.role == "Employee" and player.player_matched == 0 and len(open_offers) > 0
+        return not live_hiring(player) and not player.group.market_cleared and \
+            player.role == "Employee" and player.player_matched == 0 and player.group.open_offers_mask(player) != 0
 
     # Accept an offer (if any accepted), mark others rejected
     @staticmethod
     def before_next_page(employee: Player, timeout_happened: bool):
+        manager = None
         if timeout_happened:
-            print(f"Timeout for Worker {employee.id_in_group}, not accepting any offers")
+            event_log.timeout(employee, "GetOffers", "no offer accepted")
         elif employee.player_matched > 0:
             manager = employee.group.get_player_by_id(employee.player_matched)
-            manager.player_matched = employee.id_in_group
-
-            offers = Offer.filter(manager=manager, employee=employee, accepted=False, rejected=False)
-            assert len(offers) == 1
-            accepted_offer = offers[0]
 
-            accepted_offer.accepted = True
-            employee.offer_wage = accepted_offer.wage
-            employee.offer_training = accepted_offer.training
-
-        open_offers = Offer.filter(employee=employee, accepted=False, rejected=False)
-        for offer in open_offers:
-            offer.rejected = True
+        accept_offer(employee, manager)
 
 
 class MatchSummary(Page):
@@ -716,15 +1450,17 @@ class WaitForAcceptance(WaitPage):
     # 2) Employees without a match that didn't get offers (and didn't get shown GetOffers) or rejected all offers
     @staticmethod
     def is_displayed(player: Player):
-        open_offers = Offer.filter(employee=player, accepted=False, rejected=False)
-        return (player.role == "Manager" and player.player_matched == 0 and not player.offer_none) or \
-            (player.role == "Employee" and player.player_matched == 0 and len(open_offers) == 0)
+        return not live_hiring(player) and not player.group.market_cleared and (
+            (player.role == "Manager" and player.player_matched == 0 and not player.offer_none) or
+            (player.role == "Employee" and player.player_matched == 0 and player.group.open_offers_mask(player) == 0))
 
-    # For everyone still looking, advance Hiring phase step
+    # For everyone still looking, advance Hiring phase step. Once no Manager can hire anymore, the remaining
+    # steps are skipped by everyone.
     @staticmethod
     def after_all_players_arrive(group: Group):
-        for player in group.get_players():
+        for player in group.players:
             player.offer_step += 1
+        group.market_cleared = market_closed(group)
 
 
 class ChooseEffort(Page):
@@ -739,26 +1475,18 @@ class ChooseEffort(Page):
 
     @staticmethod
     def vars_for_template(employee: Player):
-        config = employee.session.config
-        base_revenue = config["base_revenue"]
-        employee_endowment = config["employee_endowment"]
+        economics = economics_for(employee.session)
         contract = employee.contract
-        manager = contract.manager
-        skill_multiplier = config["skill_multipliers"][employee.skill - 1]
-
-        initial_revenues = [cu(base_revenue * skill_multiplier * effort) for effort in range(1, 11)]
-        revenue_and_payoff = [calculate_manager_revenue_and_payoff(manager.group, manager, cu(revenue),
-                                                                        contract.wage,
-                                                                        contract.training)
-                             for revenue in initial_revenues]
-        employer_payoff_values = [revenue_and_payoff_item["payoff"] for revenue_and_payoff_item in revenue_and_payoff]
-        employee_payoff_values = [calculate_employee_payoff(employee_endowment, contract.wage, -effort_cost)
-                                  for effort_cost in config["effort_costs"]]
+        efforts = range(1, len(economics.effort_costs) + 1)
+
+        employer_payoff_values = [economics.manager_payoff(employee.skill, effort, contract.wage, contract.training)
+                                  for effort in efforts]
+        employee_payoff_values = [economics.employee_payoff(contract.wage, effort) for effort in efforts]
 
         return {
             "contract": contract,
             "offers": employee.offer_history,
-            "effort_costs": config["effort_costs"],
+            "effort_costs": economics.effort_costs,
             "employee_payoff_values": employee_payoff_values,
             "employer_payoff_values": employer_payoff_values,
             "future_periods": range(employee.round_number, C.NUM_ROUNDS + 1)
@@ -773,7 +1501,7 @@ class ChooseEffort(Page):
     @staticmethod
     def before_next_page(employee: Player, timeout_happened: bool):
         if timeout_happened:
-            print(f"Timeout for Worker {employee.id_in_group}, applying minimum effort")
+            event_log.timeout(employee, "ChooseEffort", "minimum effort applied")
             employee.work_effort = 1
         # Record effort spent in the Offer table
         employee.contract.effort = employee.work_effort
@@ -791,119 +1519,57 @@ class WaitForEffort(WaitPage):
     @staticmethod
     def after_all_players_arrive(group: Group):
         """Calculate all payoffs"""
-        config = group.session.config
-
-        for player in group.get_players():
-            contract = player.field_maybe_none("contract")
-
-            if player.role == "Employee":
-                endowment = config["employee_endowment"]
-                endowment_cu = cu(endowment)
-
-                if contract:
-                    print(f"Payoff for Worker {player.id_in_group}: {endowment_cu} + {contract.wage} - {-contract.effort_cost}")
-                    player.payoff = cu(calculate_employee_payoff(endowment, contract.wage, contract.effort_cost))
-                    if contract.training:
-                        player.skill_increase = True
-                else:
-                    print(f"Payoff for Worker {player.id_in_group}: {endowment_cu}")
-                    player.payoff = endowment_cu
-            else:
-                endowment_cu = cu(config["manager_endowment"])
-
-                if contract:
-                    effort = contract.employee.work_effort
-                    skill_multiplier = config["skill_multipliers"][contract.employee.skill - 1]
-                    base_revenue = config["base_revenue"]
-
-                    initial_revenue = cu(base_revenue * skill_multiplier * effort)
-                    has_training = contract.training
-                    wage = contract.wage
-                    revenue_and_payoff = calculate_manager_revenue_and_payoff(group, player, initial_revenue, wage,
-                                                                      has_training)
-
-                    print(revenue_and_payoff["message"])
-                    contract.revenue = revenue_and_payoff["revenue"]
-                    player.payoff = revenue_and_payoff["payoff"]
-                else:
-                    print(f"Payoff for Manager {player.id_in_group}: {endowment_cu}")
-                    player.payoff = endowment_cu
-
-            player.payoff_calculated = True
+        settle_payoffs(group.players)
 
 class PeriodResults(Page):
     """Period outcomes display"""
 
-    # A lot of payoff is calculated again here for display
+    # Payoff breakdown for display, from the summary recorded when payoffs were settled
     @staticmethod
     def vars_for_template(player: Player):
-        group = player.group
-        session = group.session
-        config = session.config
-        manager_endowment = config["manager_endowment"]
-        employee_endowment = config["employee_endowment"]
-        skill_multipliers = config["skill_multipliers"]
-        training_productivity_multiplier = config["training_productivity_multiplier"]
-
-        if player.field_maybe_none("contract"):
-            contract = player.contract
-            skill = contract.employee.skill
-            new_skill = min(skill + 1, len(skill_multipliers)) if contract.employee.skill_increase else skill
-            skill_multiplier = skill_multipliers[skill - 1]
-            new_skill_multiplier = skill_multipliers[new_skill - 1]
-            base_revenue = player.session.config["base_revenue"]
-            revenue = cu(base_revenue * skill_multiplier * contract.employee.work_effort)
-            wage = contract.wage if contract else 0
-            has_training = contract.training
-            effort_cost = player.session.config["effort_costs"][contract.employee.work_effort - 1]
-        else:
-            skill = 0 if player.role == "Manager" else player.skill
-            new_skill = skill
-            skill_multiplier = 0 if player.role == "Manager" else skill_multipliers[skill - 1]
-            new_skill_multiplier = skill_multiplier
-            revenue = cu(0)
-            wage = 0
-            has_training = False
-            effort_cost = 0
-
-        productivity_reduction = round(revenue * training_productivity_multiplier) if has_training else 0
-        direct_training_cost = config["training_cost"] if has_training else 0
-        revenue_and_payoff = calculate_manager_revenue_and_payoff(group, player, revenue, wage, has_training)
+        economics = economics_for(player.session)
+        skill_multipliers = economics.skill_multipliers
+        summary = player.period_summary
 
         return {
             "offers": player.offer_history,
-            "skill_multiplier": skill_multiplier,
-            "new_skill_multiplier": new_skill_multiplier,
-            "skill": skill,
-            "new_skill": new_skill,
-            "revenue": revenue,
-            "negative_productivity_reduction": -productivity_reduction,
-            "effort_cost": effort_cost,
-            "negative_effort_cost": -effort_cost,
-            "negative_direct_training_cost": -direct_training_cost,
-            "negative_overall_training_cost": -direct_training_cost - productivity_reduction,
-            "negative_wage": -wage,
-            "revenue_and_payoff": revenue_and_payoff,
-            "has_training": has_training,
-            "manager_endowment": manager_endowment,
-            "employee_endowment": employee_endowment,
+            "summary": summary,
+            "manager_label": player.label if player.role == "Manager" else summary.partner_label,
+            "employee_label": player.label if player.role == "Employee" else summary.partner_label,
+            "skill_multiplier": skill_multipliers[summary.skill - 1] if summary.skill else 0,
+            "new_skill_multiplier": skill_multipliers[summary.new_skill - 1] if summary.new_skill else 0,
+            "skill": summary.skill,
+            "new_skill": summary.new_skill,
+            "revenue": summary.revenue,
+            "negative_productivity_reduction": -summary.productivity_reduction,
+            "effort_cost": summary.effort_cost,
+            "negative_effort_cost": -summary.effort_cost,
+            "negative_direct_training_cost": -summary.training_cost,
+            "negative_overall_training_cost": -summary.training_cost - summary.productivity_reduction,
+            "negative_wage": -summary.wage,
+            "has_training": summary.training,
+            "manager_endowment": economics.manager_endowment,
+            "employee_endowment": economics.employee_endowment,
             "future_periods": range(player.round_number + 1, C.NUM_ROUNDS + 1)
         }
 
     @staticmethod
     def before_next_page(player, timeout_happened):
         if timeout_happened:
-            print(f"Timeout for Player {player.id_in_group}.")
+            event_log.timeout(player, "PeriodResults", "continued")
 
         if player.round_number == C.NUM_ROUNDS:
             player.participant.vars["labor_dump"] = {
                 "payoff_history": player.payoff_history,
             }
+        # Set last: a change before the payoff history query would be flushed by it in a statement of its own
+        player.results_seen = True
 
 
 # Repeat for NUM_ROUNDS periods (rounds/subsessions)
 # * WaitForAllPlayers to set skill levels based on previous period
 # Hiring Phase:
+#   * HiringMarket is shown to everyone if hiring runs on the live market (hiring_mode="live"). Otherwise,
 #   Repeat HIRING_STEPS times the Hiring Phase step:
 #   * MakeOffer is shown to Managers who can still make offers
 #   * WaitForOffers is shown to Employees who are not matched until all offers are made
@@ -917,4 +1583,24 @@ class PeriodResults(Page):
 # Results Phase:
 # * PeriodResults is shown to everyone to summarize their payoffs
 
-page_sequence = [WaitForAllPlayers] + [MakeOffer, WaitForOffers, GetOffers, WaitForAcceptance] * C.HIRING_STEPS + [MatchSummary, ChooseEffort, WaitForEffort, PeriodResults]
+page_sequence = [WaitForAllPlayers, HiringMarket] + [MakeOffer, WaitForOffers, GetOffers, WaitForAcceptance] * C.HIRING_STEPS + [MatchSummary, ChooseEffort, WaitForEffort, PeriodResults]
+
+
+# Query budgets: the most queries that one call of a page function may make ("render" for the template of the page),
+# including the changes the ORM writes before a query. They hold whatever the size of the market and the period, so
+# that a lookup per player or offer (N+1 queries) goes over budget: in bot runs with
+# QUERY_BUDGET_MODE=strict, the page fails (see query_budget.py)
+QUERY_BUDGETS = {
+    WaitForAllPlayers: dict(vars_for_template=0, after_all_players_arrive=4),
+    HiringMarket:      dict(is_displayed=3, vars_for_template=3, live_method=9, render=2),
+    MakeOffer:         dict(is_displayed=3, vars_for_template=2, before_next_page=4, render=2),
+    WaitForOffers:     dict(is_displayed=3, vars_for_template=0),
+    GetOffers:         dict(is_displayed=4, vars_for_template=2, before_next_page=7, render=2),
+    WaitForAcceptance: dict(is_displayed=3, vars_for_template=1, after_all_players_arrive=3),
+    MatchSummary:      dict(vars_for_template=4, render=2),
+    ChooseEffort:      dict(is_displayed=0, vars_for_template=3, js_vars=0, before_next_page=2, render=2),
+    WaitForEffort:     dict(vars_for_template=0, after_all_players_arrive=5),
+    PeriodResults:     dict(vars_for_template=3, before_next_page=2, render=0),
+}
+
+query_budget.instrument(page_sequence, QUERY_BUDGETS)
@@ -0,0 +1,104 @@
+"""Bots for the labor_market app"""
+import random
+
+from otree.api import Bot, expect
+
+import market
+from . import *
+
+
+def decision_rng(player: Player, step: int = 0) -> random.Random:
+    """Deterministic RNG per player/period/step, so bot runs are reproducible"""
+    return random.Random(f"{player.id_in_group}-{player.round_number}-{step}")
+
+
+class PlayerBot(Bot):
+    """Plays one period: hiring (in steps or on the live market), effort choice and results"""
+
+    def play_round(self):
+        # Roles are set on oTree's _role column directly (see market.assign_roles())
+        expect(self.player.role, market.market_role(self.session.config, self.player.id_in_group))
+
+        # On the live market, decisions are made by call_live_method() below, once the group is on the page
+        if HiringMarket.is_displayed(self.player):
+            yield HiringMarket
+
+        # The steps of the session's market: once every Manager made an offer to every Employee, the remaining steps
+        # of the page sequence are skipped
+        for step in range(1, 0 if live_hiring(self.player) else self.subsession.hiring_steps + 1):
+            player = self.player
+            if MakeOffer.is_displayed(player):
+                expect(player.offer_step, step)
+                yield self.make_offer(player, step)
+
+            player = self.player
+            if GetOffers.is_displayed(player):
+                yield self.get_offers(player, step)
+
+        yield MatchSummary
+
+        player = self.player
+        if ChooseEffort.is_displayed(player):
+            yield self.choose_effort(player)
+
+        # Payoffs are settled without oTree's Player.payoff setter (see settle_payoffs()): the participant's payoff must
+        # still add up
+        expect(self.participant.payoff, sum(player.payoff for player in self.player.in_all_rounds()))
+        yield PeriodResults
+
+    # Decisions are drawn from decision_rng() unless another generator is given (see simulate_sessions.py)
+
+    @staticmethod
+    def make_offer(manager: Player, step: int, rng: random.Random = None):
+        rng = rng or decision_rng(manager, step)
+        choices = [employee.id_in_group for employee in manager.for_hire()]
+
+        if rng.random() < 0.1:
+            # Do not make any offers for the rest of this period
+            return MakeOffer, dict(offer_employee=0, offer_wage=1, offer_training=False)
+
+        return MakeOffer, dict(
+            offer_employee=rng.choice(choices),
+            offer_wage=rng.randint(1, manager.session.config["max_wage"]),
+            offer_training=rng.choice([True, False])
+        )
+
+    @staticmethod
+    def get_offers(employee: Player, step: int, rng: random.Random = None):
+        rng = rng or decision_rng(employee, step)
+        # Sorted, as offers are created in the order in which managers submit
+        choices = sorted(offer.manager.id_in_group for offer in Offer.filter(employee=employee, accepted=False,
+                                                                            rejected=False))
+
+        # Reject everything sometimes, so that later hiring steps get exercised
+        return GetOffers, dict(player_matched=0 if rng.random() < 0.3 else rng.choice(choices))
+
+    @staticmethod
+    def choose_effort(employee: Player, rng: random.Random = None):
+        rng = rng or decision_rng(employee)
+        return ChooseEffort, dict(work_effort=rng.randint(1, 10))
+
+
+def call_live_method(method, group: Group, round_number: int, rng: random.Random = None, **kwargs):
+    """Plays the live market of a group (hiring_mode="live") until it closes. Managers who can still hire take turns
+    making an offer (or sometimes stop making offers), and each offer is accepted or rejected by its Employee at once.
+    """
+    rng = rng or random.Random(f"live-{group.id_in_subsession}-{round_number}")
+
+    def act(player: Player, data: dict):
+        messages = method(player.id_in_group, data)
+        expect("error", "not in", messages.get(player.id_in_group, {}))
+
+    while not group.market_cleared:
+        for manager in group.managers:
+            if not can_hire(manager):
+                continue
+            if rng.random() < 0.05:
+                act(manager, dict(type="none"))
+                continue
+
+            employee = rng.choice(manager.for_hire())
+            act(manager, dict(type="offer", employee=employee.id_in_group,
+                              wage=rng.randint(1, manager.session.config["max_wage"]),
+                              training=rng.choice([True, False])))
+            act(employee, dict(type="accept" if rng.random() < 0.6 else "reject", manager=manager.id_in_group))
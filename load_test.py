@@ -0,0 +1,258 @@
+'''
+Load test of a running oTree server with simultaneous lab sessions played by bots.
+
+To run this script (from the project root, while the server is running, e.g. with "otree prodserver 8000"):
+
+python load_test.py [--server http://localhost:8000] [--sessions N] [--config test_simulation] [--participants N]
+
+Creates N sessions (1 by default) of the session config as browser bot sessions: the server plays the bots in the
+tests.py of every app (Managers making offers, Employees accepting or rejecting them, effort choices, questionnaire
+answers), and this script acts as the browser of every participant, all at the same time (one thread each). Like a
+browser, it loads each page and submits it (the server fills in the bot's answers), and on wait pages, waits for the
+server's notification on the page's websocket, then reloads. Page JavaScript is not run.
+
+Once all sessions are over, it reports:
+* the latency of page loads (GET) and submissions (POST) per page class: count, p50, p95 and p99,
+* the release time of wait pages per page class: from the request of the last player of a group to arrive until
+  every player of the group has been notified. It includes after_all_players_arrive, which runs in that request.
+* the throughput: requests per second and sessions per hour.
+
+On the live market (hiring_mode="live"), the bot plays the whole market of a group at once (call_live_method() in
+labor_market/tests.py), within the request of the first player of the group; that request is not representative of
+single live actions (see benchmarks/bench_market_size.py for those).
+
+Release times need the group of every player, which is read from the database after the run: set DATABASE_URL the
+same way as for the server (as for export_data.py). If the server has an OTREE_AUTH_LEVEL, set the same
+OTREE_REST_KEY as well.
+
+'''
+
+import asyncio
+import html
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection, RemoteDisconnected
+from urllib.parse import urlsplit
+
+import websockets
+from otree.main import setup
+
+# Appended by the server to the pages that the bot submits next
+AUTO_SUBMIT_MARKER = 'browser-bot-auto-submit'
+# Websocket on which wait pages are notified once their group is released
+WAIT_PAGE_SOCKET = re.compile(r'makeReconnectingWebSocket\("([^"]+)"\)')
+# Seconds to wait for a wait page notification before reloading the page (see Browser.wait_for_release())
+RECHECK_SECONDS = 5
+PAGE_PATH = re.compile(r'^/p/\w+/(?P<app>\w+)/(?P<page>\w+)/(?P<index>\d+)')
+
+
+def page_name(path: str) -> str:
+    '''Page class of a URL path ("app.Page"), or its first segment for other URLs'''
+    match = PAGE_PATH.match(path)
+    return f"{match['app']}.{match['page']}" if match else path.split('/')[1]
+
+
+class Browser:
+    '''Browser of one participant: visits the pages of the session until the bot has nothing left to submit'''
+
+    def __init__(self, server_url: str, session_code: str, participant_code: str, timeout: float):
+        server = urlsplit(server_url)
+        self.connection = HTTPConnection(server.hostname, server.port, timeout=timeout)
+        self.websocket_url = f"{'wss' if server.scheme == 'https' else 'ws'}://{server.netloc}"
+        self.session_code = session_code
+        self.participant_code = participant_code
+        self.timeout = timeout
+        # (page class, method, seconds) of every request
+        self.requests = []
+        # Page index -> [time of the first request to the page, time the participant could move on, waited]
+        self.visits = {}
+        self.missed_notifications = 0
+
+    def request(self, method: str, path: str) -> tuple[int, str, str]:
+        '''Return the status, redirect location and body of a request (keeping the connection open)'''
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if method == 'POST' else {}
+        for attempt in range(2):
+            start = time.perf_counter()
+            try:
+                self.connection.request(method, path, body='' if method == 'POST' else None, headers=headers)
+                response = self.connection.getresponse()
+                break
+            except (RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # The server closed the connection while it was idle (e.g. during a wait): reconnect, like a browser
+                self.connection.close()
+                if attempt:
+                    raise
+        body = response.read().decode('utf-8')
+        self.requests.append((page_name(path), method, time.perf_counter() - start))
+        location = response.getheader('Location')
+        return response.status, location and urlsplit(location)._replace(scheme='', netloc='').geturl(), body
+
+    def wait_for_release(self, socket_path: str) -> bool:
+        '''Wait for the notification that the group of the participant is released from a wait page. Return False
+        if none came within RECHECK_SECONDS.
+
+        oTree notifies a group before the request that releases it is committed, so a websocket that connects in
+        between is never notified (a browser would wait forever). The page is reloaded then, which moves on.'''
+        async def notified():
+            async with websockets.connect(self.websocket_url + socket_path) as websocket:
+                await asyncio.wait_for(websocket.recv(), RECHECK_SECONDS)
+
+        try:
+            asyncio.run(notified())
+            return True
+        except asyncio.TimeoutError:
+            self.missed_notifications += 1
+            return False
+
+    def play(self):
+        path, method = f"/InitializeParticipant/{self.participant_code}", 'GET'
+        while True:
+            match = PAGE_PATH.match(path)
+            index = match and int(match['index'])
+            if method == 'GET' and index and index not in self.visits:
+                self.visits[index] = [time.perf_counter(), None, False]
+
+            status, location, body = self.request(method, path)
+            if status in (301, 302, 303, 307):
+                if index and self.visits[index][1] is None:
+                    self.visits[index][1] = time.perf_counter()
+                path, method = location, 'GET'
+            elif status != 200:
+                raise RuntimeError(f"{method} {path}: HTTP {status}")
+            elif AUTO_SUBMIT_MARKER in body:
+                method = 'POST'
+            elif socket := WAIT_PAGE_SOCKET.search(body):
+                if time.perf_counter() - self.visits[index][0] > self.timeout:
+                    raise RuntimeError(f"{path}: not released after {self.timeout} s")
+                if self.wait_for_release(html.unescape(socket[1])):
+                    self.visits[index][1] = time.perf_counter()
+                self.visits[index][2] = True
+                method = 'GET'
+            else:
+                # Last page: the bot has nothing more to submit
+                return
+
+
+def rest_call(server_url: str, path: str, payload: dict) -> str:
+    '''POST to the server's REST API'''
+    server = urlsplit(server_url)
+    connection = HTTPConnection(server.hostname, server.port)
+    headers = {'Content-Type': 'application/json'}
+    if os.environ.get('OTREE_REST_KEY'):
+        headers['otree-rest-key'] = os.environ['OTREE_REST_KEY']
+    connection.request('POST', path, body=json.dumps(payload), headers=headers)
+    response = connection.getresponse()
+    body = response.read().decode('utf-8')
+    if response.status != 200:
+        raise RuntimeError(f"POST {path}: HTTP {response.status} {body}")
+    return body
+
+
+def create_session(server_url: str, config_name: str, num_participants: int) -> tuple[str, list[str]]:
+    '''Create a browser bot session; return its code and the codes of its participants'''
+    session_code = rest_call(server_url, '/create_browser_bots_session',
+                             dict(session_config_name=config_name, num_participants=num_participants,
+                                  case_number=0))
+    session = json.loads(rest_call(server_url, f"/api/get_session/{session_code}", {}))
+    return session_code, [participant['code'] for participant in session['participants']]
+
+
+def release_times(browsers: list[Browser]) -> dict[str, list[float]]:
+    '''Release time of every group at every wait page where someone waited, per wait page class'''
+    from otree.api import WaitPage
+    from otree.common import get_models_module
+    from otree.database import session_scope
+    from otree.lookup import get_page_lookup
+    from otree.models import Participant
+
+    # (session, page index, group) -> visits of the players of the group
+    barriers = defaultdict(list)
+    names = {}
+    with session_scope():
+        groups = {}
+        for browser in browsers:
+            for index, visit in browser.visits.items():
+                lookup = get_page_lookup(browser.session_code, index)
+                if not issubclass(lookup.page_class, WaitPage):
+                    continue
+                if (browser.session_code, lookup.app_name) not in groups:
+                    Player = get_models_module(lookup.app_name).Player
+                    players = (Player.objects_filter(session_id=lookup.session_pk)
+                                     .join(Participant)
+                                     .with_entities(Participant.code, Player.round_number, Player.group_id))
+                    groups[browser.session_code, lookup.app_name] = {(code, round_number): group_id
+                                                                     for code, round_number, group_id in players}
+                group_id = groups[browser.session_code, lookup.app_name][browser.participant_code,
+                                                                         lookup.round_number]
+                barriers[browser.session_code, index, group_id].append(visit)
+                names[browser.session_code, index] = f"{lookup.app_name}.{lookup.page_class.__name__}"
+
+    times = defaultdict(list)
+    for (session_code, index, _), visits in barriers.items():
+        # Without anyone waiting, nobody had to be released. Barriers left by participants with errors are skipped
+        if any(waited for _, _, waited in visits) and all(released for _, released, _ in visits):
+            last_arrival = max(arrived for arrived, _, _ in visits)
+            times[names[session_code, index]].append(max(released for _, released, _ in visits) - last_arrival)
+    return times
+
+
+def percentiles(seconds: list[float]) -> list[float]:
+    '''p50, p95 and p99 in ms'''
+    if len(seconds) == 1:
+        return [seconds[0] * 1000] * 3
+    cuts = statistics.quantiles(seconds, n=100, method='inclusive')
+    return [cuts[49] * 1000, cuts[94] * 1000, cuts[98] * 1000]
+
+
+def report(title: str, samples: dict[str, list[float]]):
+    print(f"\n{title:36} {'count':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, seconds in sorted(samples.items()):
+        print(f"{name:36} {len(seconds):7d} " + ' '.join(f"{value:9.1f}" for value in percentiles(seconds)))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Load test of a running oTree server (see the top of this file)')
+    parser.add_argument('--server', default='http://localhost:8000', help='URL of the server')
+    parser.add_argument('--sessions', type=int, default=1, help='number of simultaneous sessions')
+    parser.add_argument('--config', default='test_simulation', help='session config of the sessions')
+    parser.add_argument('--participants', type=int, help='participants per session (default: num_demo_participants)')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds to wait for a page or a wait page')
+    args = parser.parse_args()
+
+    setup()
+    from otree.session import SESSION_CONFIGS_DICT
+
+    num_participants = args.participants or SESSION_CONFIGS_DICT[args.config]['num_demo_participants']
+    browsers = []
+    for _ in range(args.sessions):
+        session_code, participant_codes = create_session(args.server, args.config, num_participants)
+        browsers += [Browser(args.server, session_code, code, args.timeout) for code in participant_codes]
+    print(f"{args.sessions} sessions of {args.config} with {num_participants} participants each", file=sys.stderr)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(browsers)) as pool:
+        futures = [pool.submit(browser.play) for browser in browsers]
+        errors = [future.exception() for future in futures if future.exception()]
+    seconds = time.perf_counter() - start
+
+    for error in errors[:5]:
+        print(f"error: {error!r}", file=sys.stderr)
+
+    latencies = defaultdict(list)
+    for browser in browsers:
+        for name, method, request_seconds in browser.requests:
+            latencies[f"{name} {method}"].append(request_seconds)
+    num_requests = sum(len(browser.requests) for browser in browsers)
+
+    report('page (method)', latencies)
+    report('wait page release', release_times(browsers))
+    print(f"\n{num_requests} requests in {seconds:.1f} s: {num_requests / seconds:.1f} requests/s, "
+          f"{args.sessions / seconds * 3600:.1f} sessions/hour, {len(errors)} participants with errors, "
+          f"{sum(browser.missed_notifications for browser in browsers)} wait page notifications missed")
@@ -0,0 +1,71 @@
+"""Size of the labor market (Managers and Employees per group) of a session, from its session config.
+
+A market is an oTree group of num_managers Managers followed by num_employees Employees (6 of each by default).
+The apps have no fixed group size or role constants: creating_session() forms the groups with form_markets() or
+set_markets(), which also give every player the role of their id_in_group."""
+import random
+
+# Default market size, for session configs without num_managers/num_employees
+NUM_MANAGERS = 6
+NUM_EMPLOYEES = 6
+
+# Most Employees of a market hiring in steps: those of the default market. The page sequence has a hiring step per
+# Employee, and must not change while sessions run, so it is fixed here rather than taken from the session configs.
+# Larger markets hire on the live market (hiring_mode="live")
+MAX_STEPS_EMPLOYEES = NUM_EMPLOYEES
+
+
+def market_size(config: dict) -> tuple[int, int]:
+    """Return the numbers of Managers and Employees per market"""
+    return config.get("num_managers", NUM_MANAGERS), config.get("num_employees", NUM_EMPLOYEES)
+
+def market_role(config: dict, id_in_group: int) -> str:
+    """Return the role of a player of a market: Managers first, then Employees"""
+    return "Manager" if id_in_group <= market_size(config)[0] else "Employee"
+
+def form_markets(subsession, shuffle: bool) -> list[list[int]]:
+    """Split the players of a subsession into markets, in order or at random, and return the group matrix"""
+    num_managers, num_employees = market_size(subsession.session.config)
+    size = num_managers + num_employees
+    ids = list(range(1, len(subsession.get_players()) + 1))
+    if len(ids) % size != 0:
+        raise ValueError(f"The number of participants ({len(ids)}) must be a multiple of the market size ({size})")
+
+    if shuffle:
+        random.shuffle(ids)
+    group_matrix = [ids[start:start + size] for start in range(0, len(ids), size)]
+    set_markets(subsession, group_matrix)
+    return group_matrix
+
+def set_markets(subsession, group_matrix: list[list[int]]):
+    """Group the players of a subsession as in group_matrix, with the role of their position in their market"""
+    # Regrouping recreates every group, so it is skipped if the players are grouped that way already
+    if subsession.get_group_matrix() != group_matrix:
+        subsession.set_group_matrix(group_matrix)
+    assign_roles(subsession)
+
+def assign_roles(subsession):
+    """Give every player of a subsession the role of their id_in_group.
+
+    oTree only knows roles from _ROLE constants, and resets them whenever players are regrouped."""
+    config = subsession.session.config
+    for player in subsession.get_players():
+        # Player.role has no setter: _role is the column behind it in oTree 5, which oTree's own regrouping sets the
+        # same way. The bots check every player's role against their position in the market
+        player._role = market_role(config, player.id_in_group)
+
+def starting_skills(config: dict) -> list[int]:
+    """Return the starting skill of each Employee of a market.
+
+    The starting_skills of the session config are stretched to num_employees, keeping their order and proportions
+    (e.g. [5, 5, 5, 1, 1, 1] becomes ten 5s and ten 1s for 20 Employees)."""
+    skills = config["starting_skills"]
+    num_employees = market_size(config)[1]
+    return [skills[index * len(skills) // num_employees] for index in range(num_employees)]
+
+NUMBER_WORDS = ["zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten", "eleven",
+                "twelve"]
+
+def number_text(number: int) -> str:
+    """Return a count as written in the instructions ("six", but "20")"""
+    return NUMBER_WORDS[number] if number < len(NUMBER_WORDS) else str(number)
@@ -4,6 +4,8 @@ from typing import Iterator, List
 from otree.api import *
 from otree.currency import RealWorldCurrency
 
+import market
+from economics import economics_for
 from . import nodes_extra
 
 # Constants
@@ -19,20 +21,7 @@ class C(BaseConstants):
 
     NUM_ROUNDS = 1
     NAME_IN_URL = "outro_quiz"
-    PLAYERS_PER_GROUP = None
-
-    MANAGER1_ROLE = "Manager"
-    MANAGER2_ROLE = "Manager"
-    MANAGER3_ROLE = "Manager"
-    MANAGER4_ROLE = "Manager"
-    MANAGER5_ROLE = "Manager"
-    MANAGER6_ROLE = "Manager"
-    EMPLOYEE1_ROLE = "Employee"
-    EMPLOYEE2_ROLE = "Employee"
-    EMPLOYEE3_ROLE = "Employee"
-    EMPLOYEE4_ROLE = "Employee"
-    EMPLOYEE5_ROLE = "Employee"
-    EMPLOYEE6_ROLE = "Employee"
+    PLAYERS_PER_GROUP = None # Markets are formed in creating_session() (see market.py)
 
     LIKERT_SCALE_DISAGREE_AGREE = { 1: "Strongly disagree", 2: "", 3: "", 4:"", 5: "", 6: "", 7: "Strongly agree" }
     LIKERT_SCALE_LOWER_HIGHER = { -3: "Much lower", -2: "", -1: "", 0: "The same", 1: "", 2: "", 3: "Much higher" }
@@ -43,16 +32,6 @@ class C(BaseConstants):
 
 # Functions
 
-def multiplier_to_table_item(mult_tuple: tuple[int, int]):
-    """Prepare multiplier table for template"""
-    index, multiplier = mult_tuple
-
-    return {
-        "level": index + 1,
-        "multiplier": multiplier,
-        "revenue": [effort * multiplier for effort in range(1, 11)]
-    }
-
 def custom_export(players) -> Iterator[List[str | int | float]]:
     yield [
         "outro_quiz.session_code",
@@ -160,14 +139,11 @@ class Subsession(BaseSubsession):
     @property
     def skill_table(self):
         """Prepare skill table for template"""
-        return list(map(
-            multiplier_to_table_item,
-            enumerate(self.session.config["skill_multipliers"])
-        ))
+        return economics_for(self.session).skill_table
 
     @property
     def effort_table(self):
-        return self.session.config["effort_costs"]
+        return economics_for(self.session).effort_costs
 
 
 @staticmethod
@@ -178,20 +154,21 @@ def creating_session(subsession: Subsession):
     if subsession.round_number == 1:
         if "frozen_matrix" in subsession.session.vars:
             # If we had the players set from the previous app, use it
-            subsession.set_group_matrix(subsession.session.vars["frozen_matrix"])
+            market.set_markets(subsession, subsession.session.vars["frozen_matrix"])
         else:
             # If session config dictates, reshuffle participants randomly
-            if subsession.session.config["randomize_roles"]:
-                subsession.group_randomly()
+            market.form_markets(subsession, shuffle=subsession.session.config["randomize_roles"])
 
+        skills = market.starting_skills(subsession.session.config)
         for group in subsession.get_groups():
             # Set initial skills according to session config. This should be the same regardless of whether
             # this is the first app or not.
             for index, player in enumerate(group.employees):
-                player.skill = subsession.session.config["starting_skills"][index]
+                player.skill = skills[index]
     else:
         # In subsequent Periods, retain the same group/role and labels
         subsession.group_like_round(1)
+        market.assign_roles(subsession)
         for player in subsession.get_players():
             player.label = player.in_round(1).label
 
@@ -0,0 +1,22 @@
+"""Bots for the outro_quiz app"""
+from otree.api import Bot, Submission
+
+from . import *
+
+
+class PlayerBot(Bot):
+    """Answers the post-experiment and demographic questionnaires"""
+
+    def play_round(self):
+        # PEQ pages use a scripted "next" button, so the submit button check is skipped
+        yield Submission(PEQ, {field: 1 for field in PEQ.get_form_fields(self.player)}, check_html=False)
+        yield DemographicQuiz, dict(
+            demographic_quiz1="Prefer not to answer",
+            demographic_quiz2=21,
+            demographic_quiz3="Junior",
+            demographic_quiz4="Economics",
+            demographic_quiz5=3.5,
+            demographic_quiz6=2,
+            demographic_quiz7=5,
+            demographic_quiz8="Bot strategy",
+        )
@@ -0,0 +1,181 @@
+"""Database queries per page hook and template render, counted against per-page query budgets.
+
+Every query run through the database engine is counted and timed, and instrument() wraps the hooks of page classes
+(is_displayed, vars_for_template, js_vars, before_next_page, after_all_players_arrive and live_method) and the
+rendering of their templates, so that the queries of each call are recorded in page_stats, per page and hook.
+Templates of wait pages are oTree's own, and their rendering is not recorded.
+
+Budgets give the most queries that one call of a hook (or "render") of a page may make. They are meant to hold
+whatever the market size and period, so a call over budget is a regression, typically an N+1 pattern (one query
+per player or offer). What happens depends on QUERY_BUDGET_MODE in settings.py:
+* "strict" (for bot runs, "QUERY_BUDGET_MODE=strict otree test <config>", and in simulate_sessions.py): a call over
+  budget raises QueryBudgetExceeded,
+* "log": the page goes on, and a warning event is logged (see event_log.py),
+* "off" (the default): nothing is counted, and neither pages nor the database engine are instrumented."""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Iterator, Optional
+
+from otree import settings
+from otree.api import WaitPage
+from otree.database import engine
+from sqlalchemy import event
+
+import event_log
+
+HOOKS = ("is_displayed", "vars_for_template", "js_vars", "before_next_page", "after_all_players_arrive",
+         "live_method")
+
+MODES = ("off", "log", "strict")
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryStats:
+    """Queries run within a scope (see counting()), and the seconds spent in them"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+class HookStats:
+    """Calls of a page hook, with their queries and seconds in total"""
+
+    def __init__(self, budget: Optional[int]):
+        self.budget = budget
+        self.calls = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.query_seconds = 0.0
+        self.seconds = 0.0
+
+    def add(self, queries: QueryStats, seconds: float):
+        self.calls += 1
+        self.queries += queries.count
+        self.max_queries = max(self.max_queries, queries.count)
+        self.query_seconds += queries.seconds
+        self.seconds += seconds
+
+    def merge(self, other: "HookStats"):
+        """Add the calls of other (e.g. from another process)"""
+        self.calls += other.calls
+        self.queries += other.queries
+        self.max_queries = max(self.max_queries, other.max_queries)
+        self.query_seconds += other.query_seconds
+        self.seconds += other.seconds
+
+
+# (page, hook) -> stats of the calls so far, in this process. Pages are named "app.Page"
+page_stats: dict[tuple[str, str], HookStats] = {}
+
+# Scopes open in the current thread, innermost last. A query counts in all of them
+_scopes = threading.local()
+
+
+def _query_started(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _query_finished(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - conn.info["query_start"].pop()
+    for stats in getattr(_scopes, "stack", ()):
+        stats.count += 1
+        stats.seconds += seconds
+
+
+def listen():
+    """Count the queries of the database engine from now on (see counting())"""
+    if not event.contains(engine, "before_cursor_execute", _query_started):
+        event.listen(engine, "before_cursor_execute", _query_started)
+        event.listen(engine, "after_cursor_execute", _query_finished)
+
+
+@contextmanager
+def counting() -> Iterator[QueryStats]:
+    """Count the queries run in the current thread within the with block"""
+    stats = QueryStats()
+    stack = _scopes.__dict__.setdefault("stack", [])
+    stack.append(stats)
+    try:
+        yield stats
+    finally:
+        stack.remove(stats)
+
+
+def reset_stats():
+    for stats in page_stats.values():
+        stats.__init__(stats.budget)
+
+
+def mode() -> str:
+    """QUERY_BUDGET_MODE of settings.py (see MODES)"""
+    value = getattr(settings, "QUERY_BUDGET_MODE", "off")
+    if value not in MODES:
+        raise ValueError(f"QUERY_BUDGET_MODE must be one of {', '.join(MODES)}")
+    return value
+
+
+@contextmanager
+def measured(page_name: str, hook: str, player_or_group):
+    """Record the queries of a call of a page hook, and check them against its budget"""
+    stats = page_stats[page_name, hook]
+    start = time.perf_counter()
+    with counting() as queries:
+        yield
+    stats.add(queries, time.perf_counter() - start)
+
+    if stats.budget is not None and queries.count > stats.budget:
+        if mode() == "strict":
+            raise QueryBudgetExceeded(f"{page_name}.{hook} ran {queries.count} queries, over its budget of "
+                                      f"{stats.budget}")
+        event_log.query_budget_exceeded(player_or_group, page_name, hook, queries.count, stats.budget)
+
+
+def measured_hook(page_name: str, hook: str, function):
+    @wraps(function)
+    def hook_function(*args, **kwargs):
+        # The player, or the group for after_all_players_arrive (which oTree passes as a keyword)
+        player_or_group = args[0] if args else next(iter(kwargs.values()))
+        with measured(page_name, hook, player_or_group):
+            return function(*args, **kwargs)
+    return hook_function
+
+
+def measured_render(page_name: str, render_to_response):
+    @wraps(render_to_response)
+    def render(page, context):
+        with measured(page_name, "render", page.player):
+            return render_to_response(page, context)
+    return render
+
+
+def instrument(page_classes: list, budgets: dict[type, dict[str, int]]):
+    """Record the queries of the hooks and template renders of page classes (each listed once or more, as in a page
+    sequence), with budgets per page class and hook ("render" for the template) where given. The budgets are
+    validated in any mode, but the pages are only instrumented if QUERY_BUDGET_MODE is not "off"."""
+    enabled = mode() != "off"
+    if enabled:
+        listen()
+    for page_class in dict.fromkeys(page_classes):
+        page_name = f"{page_class.__module__}.{page_class.__name__}"
+        page_budgets = budgets.get(page_class, {})
+        names = [hook for hook in HOOKS if hook in vars(page_class)]
+        if not issubclass(page_class, WaitPage):
+            names.append("render")
+        unknown = set(page_budgets) - set(names)
+        if unknown:
+            raise ValueError(f"{page_name} has budgets for hooks it does not define: {', '.join(sorted(unknown))}")
+        if not enabled:
+            continue
+
+        for name in names:
+            page_stats[page_name, name] = HookStats(page_budgets.get(name))
+            if name == "render":
+                page_class.render_to_response = measured_render(page_name, page_class.render_to_response)
+            else:
+                setattr(page_class, name, staticmethod(measured_hook(page_name, name, getattr(page_class, name))))
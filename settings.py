@@ -49,6 +49,26 @@ SESSION_CONFIGS = [
         market="heterogeneous",
         starting_skills=STARTING_SKILLS_BY_MARKET["heterogeneous"]
     ),
+    dict(
+        name="test_live_market",
+        app_sequence=["labor_market", "outro_quiz"],
+        num_demo_participants=12,
+        max_rounds=3,
+        market="heterogeneous",
+        starting_skills=STARTING_SKILLS_BY_MARKET["heterogeneous"],
+        hiring_mode="live"
+    ),
+    dict(
+        name="test_large_market",
+        app_sequence=["labor_market", "outro_quiz"],
+        num_demo_participants=40,
+        max_rounds=3,
+        market="heterogeneous",
+        starting_skills=STARTING_SKILLS_BY_MARKET["heterogeneous"],
+        num_managers=20,
+        num_employees=20,
+        hiring_mode="live"
+    ),
     dict(
         name="test_outro",
         app_sequence=["outro_quiz"],
@@ -82,9 +102,17 @@ SESSION_CONFIG_DEFAULTS = dict(
         The possible values and their corresponding skill levels are the following.<br/> 
         homogeneous_low: [1, 1, 1, 1, 1, 1]<br/>
         homogeneous_high: [5, 5, 5, 5, 5, 5]<br/>
-        heterogeneous: [5, 5, 5, 1, 1, 1]
+        heterogeneous: [5, 5, 5, 1, 1, 1]<br/>
+        Each market has 'num_managers' employers and 'num_employees' workers; the number of participants must be
+        a multiple of their sum. With more than six workers, the skill levels above are stretched in the same
+        proportions (e.g. ten workers with skill level 5 and ten with skill level 1 out of 20).<br/>
+        Set 'hiring_mode' to "live" for a continuous hiring market on a single page, instead of
+        the hiring steps ("steps"). Markets of more than six workers must hire live.
         """,
-    randomize_roles=False
+    randomize_roles=False,
+    num_managers=6,
+    num_employees=6,
+    hiring_mode="steps"
 )
 
 SESSION_FIELDS = ["skill_table"]
@@ -98,6 +126,16 @@ LANGUAGE_CODE = 'en'
 REAL_WORLD_CURRENCY_CODE = 'USD'
 USE_POINTS = True
 
+# Structured event log (see event_log.py), off unless EVENT_LOG_FILE is set (e.g. to events.jsonl on the server). In
+# production, EVENT_LOG_LEVEL=WARNING keeps only timeouts and queries over budget
+EVENT_LOG_FILE = environ.get('EVENT_LOG_FILE')
+EVENT_LOG_LEVEL = environ.get('EVENT_LOG_LEVEL', 'INFO')
+
+# Query budgets of the pages (see query_budget.py): "strict" fails pages over budget, for bot runs
+# (QUERY_BUDGET_MODE=strict otree test <config>); "log" only logs them as warning events, e.g. on a staging server;
+# "off" does not count queries
+QUERY_BUDGET_MODE = environ.get('QUERY_BUDGET_MODE', 'off')
+
 ADMIN_USERNAME = 'admin'
 # for security, best to set admin password in an environment variable
 ADMIN_PASSWORD = environ.get('OTREE_ADMIN_PASSWORD')
@@ -0,0 +1,371 @@
+'''
+Headless regression run of the labor_market app: plays complete sessions in-process and checks their outcome.
+
+To run this script (from the project root):
+
+python simulate_sessions.py [--sessions N] [--config test_simulation] [--participants N] [--decisions bots|random]
+                            [--seed SEED] [--workers N] [--queries]
+
+Creates N sessions (10 by default) of the session config in an in-memory database and plays all periods of
+labor_market in each, without a server: for every page of the page sequence, in order, every group runs the page
+functions the server would run, with the page hooks called directly.
+* On pages, every player in turn: is_displayed, then, if displayed, vars_for_template and js_vars (templates are not
+  rendered) and the decisions of the player; then, as the submission of the page, the decisions as form fields
+  (checked against the choices and bounds of the form, like a submitted form) and before_next_page.
+* On wait pages: after_all_players_arrive, if the page is displayed to anyone in the group (otherwise oTree skips it).
+* On the live market (hiring_mode="live"), the whole market of a group is played by call_live_method() of
+  labor_market/tests.py, in one request (as in bot runs).
+Every page load, submission and barrier runs like a request of its own: on freshly loaded objects, with the ORM
+objects of the previous request dropped.
+
+Decisions are those of the bots in labor_market/tests.py: with --decisions bots (the default), the same as in
+"otree test", so every session plays the same way; with --decisions random, they are drawn from a generator seeded with
+the seed and the number of the session, so every session plays differently (and the same again with the same seed).
+
+While sessions are played, every call of a page function must stay within its query budget (labor_market.QUERY_BUDGETS,
+see query_budget.py), or the session fails. Once a session is over, its outcome is checked:
+* every player has at most one contract per period, and Managers and Employees of a contract point at each other,
+* payoffs are the endowment without a contract, and the payoff of the contract (economics.py) with one,
+* every player has one PeriodSummary per period, with their payoff and the skill of the next period,
+* skills start at the starting_skills of the config, and go up by one after a period with training (up to the
+  highest skill level),
+* the payoff of every participant is the sum of their payoffs in all periods.
+The script prints every problem found and exits with status 1 if there was any, so it can gate a build; it also prints
+the throughput in sessions per hour, and with --queries, the queries and time per call of every page function.
+
+Sessions are played one after another, or in N worker processes (each with its own in-memory database) with --workers.
+Events are not logged unless EVENT_LOG_FILE is set (see event_log.py).
+
+'''
+
+import copy
+import os
+import random
+import sys
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from multiprocessing import get_context
+
+os.environ['OTREE_IN_MEMORY'] = '1'
+os.environ['QUERY_BUDGET_MODE'] = 'strict'
+
+from otree.main import setup  # noqa: E402
+
+# Problems reported per session, at most
+MAX_PROBLEMS = 20
+
+
+# The oTree and app imports below are done inside the functions, since they need setup() to have run first
+
+def new_request():
+    '''Drop the ORM objects of the previous request, as the server does between requests'''
+    from otree.database import db
+
+    db._db.flush()
+    db._db.expunge_all()
+
+
+def page_hook(page_class, name: str):
+    '''Hook of a page class, or None if the page does not define it'''
+    from otree.api import Page, WaitPage
+
+    hook = getattr(page_class, name, None)
+    base = WaitPage if issubclass(page_class, WaitPage) else Page
+    return hook if hook is not getattr(base, name, None) else None
+
+
+def is_displayed(page_class, player) -> bool:
+    hook = page_hook(page_class, 'is_displayed')
+    return hook is None or bool(hook(player))
+
+
+def decisions(page_class, player, rng) -> dict:
+    '''Form fields submitted by a player on a page, as decided by their bot'''
+    from labor_market import ChooseEffort, GetOffers, MakeOffer
+    from labor_market.tests import PlayerBot
+
+    if page_class is MakeOffer:
+        return PlayerBot.make_offer(player, player.offer_step, rng)[1]
+    if page_class is GetOffers:
+        return PlayerBot.get_offers(player, player.offer_step, rng)[1]
+    if page_class is ChooseEffort:
+        return PlayerBot.choose_effort(player, rng)[1]
+    return {}
+
+
+def submit_form(page_class, player, values: dict):
+    '''Set the form fields of a page, after checking them like oTree checks a submitted form: against the choices
+    and bounds of the field, or the <field>_choices/_min/_max functions of the app'''
+    app = sys.modules[page_class.__module__]
+    for name in getattr(page_class, 'form_fields', []):
+        if name not in values:
+            raise ValueError(f"{page_class.__name__}: no value for {name}")
+        value = values[name]
+        props = type(player).__table__.c[name].form_props
+        choices = getattr(app, f"{name}_choices", None)
+        choices = choices(player) if choices else props.get('choices')
+        if choices is not None:
+            choices = [choice[0] if isinstance(choice, (list, tuple)) else choice for choice in choices]
+            if value not in choices:
+                raise ValueError(f"{page_class.__name__}: {name}={value!r} is not one of {choices}")
+        for bound, out_of_bounds in [('min', lambda limit: value < limit), ('max', lambda limit: value > limit)]:
+            limit = getattr(app, f"{name}_{bound}", None)
+            limit = limit(player) if limit else props.get(bound)
+            if limit is not None and out_of_bounds(limit):
+                raise ValueError(f"{page_class.__name__}: {name}={value!r} is out of bounds ({bound} {limit})")
+        setattr(player, name, value)
+
+
+def play_page(page_class, player_id: int, rng):
+    '''One player's visit of a page: loading it, then submitting it, in a request each'''
+    from labor_market import Player
+
+    new_request()
+    player = Player.objects_get(id=player_id)
+    if not is_displayed(page_class, player):
+        return
+    for name in ('vars_for_template', 'js_vars'):
+        hook = page_hook(page_class, name)
+        if hook:
+            hook(player)
+    values = decisions(page_class, player, rng)
+
+    new_request()
+    player = Player.objects_get(id=player_id)
+    submit_form(page_class, player, values)
+    hook = page_hook(page_class, 'before_next_page')
+    if hook:
+        hook(player, timeout_happened=False)
+
+
+def play_wait_page(page_class, group_id: int):
+    '''Barrier of a group at a wait page, in a request of its own'''
+    from labor_market import Group
+
+    new_request()
+    hook = page_hook(page_class, 'after_all_players_arrive')
+    group = Group.objects_get(id=group_id)
+    if hook and any(is_displayed(page_class, player) for player in group.players):
+        hook(group)
+
+
+def play_live_market(group_id: int, rng):
+    '''Live market of a group, played by the bots in one request'''
+    from labor_market import Group, HiringMarket
+    from labor_market.tests import call_live_method
+
+    new_request()
+    group = Group.objects_get(id=group_id)
+    players = {player.id_in_group: player for player in group.players}
+    call_live_method(lambda id_in_group, data: HiringMarket.live_method(players[id_in_group], data), group=group,
+                     round_number=group.round_number, page_class=HiringMarket, rng=rng)
+
+
+def play_session(session_id: int, rng):
+    '''Play all periods of labor_market in a session'''
+    from otree.api import WaitPage
+    from labor_market import C, HiringMarket, Player, live_hiring, page_sequence
+
+    players = (Player.objects_filter(session_id=session_id)
+                     .order_by(Player.round_number, Player.group_id, Player.id_in_group)
+                     .with_entities(Player.id, Player.round_number, Player.group_id))
+    groups = {}
+    for player_id, round_number, group_id in players:
+        groups.setdefault(round_number, {}).setdefault(group_id, []).append(player_id)
+
+    for round_number in range(1, C.NUM_ROUNDS + 1):
+        for page_class in page_sequence:
+            for group_id, player_ids in groups[round_number].items():
+                if issubclass(page_class, WaitPage):
+                    play_wait_page(page_class, group_id)
+                    continue
+                if page_class is HiringMarket:
+                    new_request()
+                    if live_hiring(Player.objects_get(id=player_ids[0])):
+                        play_live_market(group_id, rng)
+                for player_id in player_ids:
+                    play_page(page_class, player_id, rng)
+
+
+def session_problems(session_id: int) -> list[str]:
+    '''Problems with the outcome of a finished session (see the top of this file)'''
+    from otree.api import cu
+    from economics import economics_for
+    import market
+    from labor_market import C, Offer, PeriodSummary, Player
+
+    new_request()
+    players = Player.objects_filter(session_id=session_id).order_by(Player.round_number, Player.id).all()
+    session = players[0].session
+    economics = economics_for(session)
+    num_managers = market.market_size(session.config)[0]
+    starting_skills = market.starting_skills(session.config)
+    by_id = {player.id: player for player in players}
+    by_round = {(player.participant_id, player.round_number): player for player in players}
+
+    contracts = {}
+    for offer in Offer.objects_filter(session_id=session_id, accepted=True):
+        for player_id in (offer.manager_id, offer.employee_id):
+            contracts.setdefault(player_id, []).append(offer)
+    summaries = {}
+    for summary in PeriodSummary.objects_filter(PeriodSummary.player_id.in_(by_id)):
+        summaries.setdefault(summary.player_id, []).append(summary)
+
+    problems = []
+    totals = {}
+    for player in players:
+        name = f"period {player.round_number}, {player.role} {player.id_in_group} of group {player.group_id}"
+        totals[player.participant_id] = totals.get(player.participant_id, 0) + player.payoff
+
+        # Skill of the period, from the skill and contract of the previous one
+        if player.round_number == 1:
+            skill = starting_skills[player.id_in_group - num_managers - 1] if player.role == 'Employee' else 1
+        else:
+            previous = by_round[player.participant_id, player.round_number - 1]
+            trained = [contract for contract in contracts.get(previous.id, [])
+                       if contract.employee_id == previous.id and contract.training]
+            skill = min(previous.skill + 1, len(economics.skill_multipliers)) if trained else previous.skill
+        if player.skill != skill:
+            problems.append(f"{name}: skill {player.skill}, expected {skill}")
+
+        player_contracts = contracts.get(player.id, [])
+        if len(player_contracts) > 1:
+            problems.append(f"{name}: {len(player_contracts)} contracts")
+            continue
+        if player_contracts:
+            contract = player_contracts[0]
+            manager, employee = by_id[contract.manager_id], by_id[contract.employee_id]
+            if (manager.player_matched, employee.player_matched) != (employee.id_in_group, manager.id_in_group):
+                problems.append(f"{name}: contract of Manager {manager.id_in_group} and Employee "
+                                f"{employee.id_in_group}, who are matched with {manager.player_matched} and "
+                                f"{employee.player_matched}")
+            if not 1 <= contract.effort <= len(economics.effort_costs):
+                problems.append(f"{name}: contract with effort {contract.effort}")
+                continue
+            if player.role == 'Manager':
+                payoff = economics.manager_payoff(employee.skill, contract.effort, contract.wage, contract.training)
+            else:
+                payoff = economics.employee_payoff(contract.wage, contract.effort)
+        else:
+            if player.player_matched != 0:
+                problems.append(f"{name}: matched with {player.player_matched} without a contract")
+            payoff = economics.manager_endowment if player.role == 'Manager' else economics.employee_endowment
+        if player.payoff != cu(payoff):
+            problems.append(f"{name}: payoff {player.payoff}, expected {cu(payoff)}")
+
+        player_summaries = summaries.get(player.id, [])
+        if len(player_summaries) != 1:
+            problems.append(f"{name}: {len(player_summaries)} period summaries")
+            continue
+        summary = player_summaries[0]
+        if summary.payoff != player.payoff:
+            problems.append(f"{name}: payoff {summary.payoff} in the period summary, {player.payoff} in the period")
+        if player.role == 'Employee' and player.round_number < C.NUM_ROUNDS:
+            next_skill = by_round[player.participant_id, player.round_number + 1].skill
+            if summary.new_skill != next_skill:
+                problems.append(f"{name}: new skill {summary.new_skill} in the period summary, {next_skill} in "
+                                f"the next period")
+
+    for player in players:
+        participant = player.participant
+        if player.round_number == 1 and participant.payoff != totals[participant.id]:
+            problems.append(f"participant {participant.code}: payoff {participant.payoff}, expected the sum of the "
+                            f"periods {totals[participant.id]}")
+    return problems
+
+
+def run_session(config_name: str, num_participants: int, decisions_mode: str, seed: str,
+                number: int) -> tuple[str, float, int, list[str], dict]:
+    '''Create, play and check one session; return its code, seconds to play it, number of contracts, problems and
+    the queries of the page hooks'''
+    import otree.session
+    from otree.database import db
+    import query_budget
+    from labor_market import Offer
+
+    query_budget.reset_stats()
+    start = time.perf_counter()
+    session = otree.session.create_session(session_config_name=config_name, num_participants=num_participants)
+    session_id, session_code = session.id, session.code
+    rng = random.Random(f"{seed}-{number}") if decisions_mode == 'random' else None
+    try:
+        play_session(session_id, rng)
+    except Exception as exc:
+        db.rollback()
+        return session_code, time.perf_counter() - start, 0, [f"{type(exc).__name__}: {exc}"], {}
+    seconds = time.perf_counter() - start
+    # Copies, since the stats are reset for the next session
+    query_stats = {key: copy.copy(stats) for key, stats in query_budget.page_stats.items()}
+
+    problems = session_problems(session_id)
+    num_contracts = Offer.objects_filter(session_id=session_id, accepted=True).count()
+    db.commit()
+    return session_code, seconds, num_contracts, problems, query_stats
+
+
+def report_queries(query_stats: dict):
+    '''Print the queries and time per call of every page hook'''
+    print(f"\n{'page hook':44} {'calls':>7} {'queries':>8} {'max':>4} {'budget':>6} {'ms':>7} {'query ms':>8}")
+    for (page_name, hook), stats in sorted(query_stats.items()):
+        if stats.calls:
+            print(f"{page_name + '.' + hook:44} {stats.calls:7d} {stats.queries / stats.calls:8.1f} "
+                  f"{stats.max_queries:4d} {'-' if stats.budget is None else stats.budget:>6} "
+                  f"{stats.seconds / stats.calls * 1000:7.2f} {stats.query_seconds / stats.calls * 1000:8.2f}")
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Play and check labor_market sessions in-process (see the top of this file)')
+    parser.add_argument('--sessions', type=int, default=10, help='number of sessions')
+    parser.add_argument('--config', default='test_simulation', help='session config of the sessions')
+    parser.add_argument('--participants', type=int, help='participants per session (default: num_demo_participants)')
+    parser.add_argument('--decisions', choices=['bots', 'random'], default='bots',
+                        help='decisions of the bots as in "otree test", or random ones')
+    parser.add_argument('--seed', default='0', help='seed of the random decisions')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--queries', action='store_true', help='print the queries and time of every page hook')
+    args = parser.parse_args()
+
+    setup()
+    from otree.session import SESSION_CONFIGS_DICT
+    from query_budget import HookStats
+
+    num_participants = args.participants or SESSION_CONFIGS_DICT[args.config]['num_demo_participants']
+    play = partial(run_session, args.config, num_participants, args.decisions, args.seed)
+    print(f"{args.sessions} sessions of {args.config} with {num_participants} participants each, "
+          f"{args.decisions} decisions", file=sys.stderr)
+
+    start = time.perf_counter()
+    if args.workers > 1:
+        # "spawn" gives every worker its own in-memory database
+        pool = ProcessPoolExecutor(max_workers=args.workers, mp_context=get_context('spawn'), initializer=setup)
+        results = pool.map(play, range(args.sessions))
+    else:
+        pool = None
+        results = map(play, range(args.sessions))
+
+    failed = 0
+    seconds = []
+    contracts = 0
+    query_stats = {}
+    for session_code, session_seconds, num_contracts, problems, session_query_stats in results:
+        seconds.append(session_seconds)
+        contracts += num_contracts
+        for key, stats in session_query_stats.items():
+            query_stats.setdefault(key, HookStats(stats.budget)).merge(stats)
+        if problems:
+            failed += 1
+            print(f"session {session_code}: {len(problems)} problems", file=sys.stderr)
+            for problem in problems[:MAX_PROBLEMS]:
+                print(f"  {problem}", file=sys.stderr)
+    if pool:
+        pool.shutdown()
+    total_seconds = time.perf_counter() - start
+
+    if args.queries:
+        report_queries(query_stats)
+    print(f"{args.sessions} sessions in {total_seconds:.1f} s: {args.sessions / total_seconds * 3600:.0f} sessions/hour "
+          f"({sum(seconds) / len(seconds):.2f} s per session), {contracts / args.sessions:.1f} contracts per session, "
+          f"{failed} sessions with problems")
+    sys.exit(1 if failed else 0)